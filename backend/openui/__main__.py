@@ -6,11 +6,21 @@ from .litellm import generate_config
 import os
 import uvicorn
 from uvicorn import Config
+from peewee import SqliteDatabase
 import sys
 import subprocess
 import time
 
 
+def arg_value(name: str, default=None):
+    for i, arg in enumerate(sys.argv):
+        if arg == name and i + 1 < len(sys.argv):
+            return sys.argv[i + 1]
+        if arg.startswith(f"{name}="):
+            return arg.split("=", 1)[1]
+    return default
+
+
 def is_running_in_docker():
     # Check for the .dockerenv file
     if os.path.exists("/.dockerenv"):
@@ -31,7 +41,55 @@ def is_running_in_docker():
     return False
 
 
+def import_profile(top: int = 25):
+    """Prints where the server's import time goes, from a fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import openui.server"],
+        capture_output=True,
+        text=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, cumulative, name = line[len("import time:") :].split("|")
+        modules.append((int(own), int(cumulative), name.strip()))
+    if not modules:
+        print(result.stderr, file=sys.stderr)
+        return
+    packages: dict[str, int] = {}
+    for own, _, name in modules:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + own
+    total = max(cumulative for _, cumulative, _ in modules)
+    print(f"Importing openui.server took {total / 1000:.0f}ms\n")
+    print("Slowest modules (cumulative ms):")
+    for _, cumulative, name in sorted(modules, key=lambda m: -m[1])[:top]:
+        print(f"  {cumulative / 1000:8.1f}  {name}")
+    print("\nSlowest packages (self ms):")
+    for package, own in sorted(packages.items(), key=lambda p: -p[1])[:top]:
+        print(f"  {own / 1000:8.1f}  {package}")
+
+
+def vacuum():
+    """Enables incremental vacuum on a SQLite database, run with the server stopped"""
+    from .maintenance import database, enable_incremental_vacuum
+
+    if not isinstance(database, SqliteDatabase):
+        print("Only SQLite databases need vacuuming", file=sys.stderr)
+        return
+    start = time.monotonic()
+    enable_incremental_vacuum()
+    print(f"Vacuumed {database.database} in {time.monotonic() - start:.1f}s")
+
+
 if __name__ == "__main__":
+    if "--import-profile" in sys.argv:
+        import_profile()
+        sys.exit(0)
+    if "--vacuum" in sys.argv:
+        vacuum()
+        sys.exit(0)
     ui = any([arg == "-i" for arg in sys.argv])
     litellm = (
         any([arg == "--litellm" for arg in sys.argv])
@@ -50,6 +108,14 @@ if __name__ == "__main__":
         config.ENV = config.Env.DEV
         logger.info("Running in dev mode")
 
+    workers = int(arg_value("--workers", config.WORKERS))
+    if workers > 1 and (ui or reload):
+        logger.warning("Multiple workers aren't supported with -i or --dev")
+        workers = 1
+    # Workers are spawned and read their config from the environment
+    config.WORKERS = workers
+    os.environ["OPENUI_WORKERS"] = str(workers)
+
     try:
         from .tui.app import OpenUIApp
 
@@ -70,6 +136,7 @@ if __name__ == "__main__":
             log_config=str(config_file) if ui else None,
             port=config.PORT,
             reload=reload,
+            workers=workers,
         )
     )
     if ui:
@@ -114,5 +181,8 @@ if __name__ == "__main__":
                 port=config.PORT,
                 reload=reload,
             )
+        elif workers > 1:
+            logger.info("Running %d workers", workers)
+            api_server.run_workers()
         else:
-            api_server.run_with_wandb()
+            api_server.run()
@@ -0,0 +1,89 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+from .logs import logger
+
+Fetcher = Callable[[], Awaitable[Any]]
+
+
+class ModelCatalog:
+    """Model lists per provider, served from memory and refreshed in the background
+
+    Each provider has its own TTL. Once an entry is stale it is still served
+    while a refresh runs, and a failed refresh keeps the last good list.
+    """
+
+    def __init__(self, fetchers: dict[str, Fetcher], ttls: dict[str, float]):
+        self.fetchers = fetchers
+        self.ttls = ttls
+        self.models: dict[str, Any] = {}
+        self.fetched: dict[str, float] = {}
+        self.refreshing: dict[str, asyncio.Task] = {}
+        self.task: asyncio.Task | None = None
+
+    def stale(self, provider: str) -> bool:
+        age = time.monotonic() - self.fetched.get(provider, float("-inf"))
+        return age > self.ttls.get(provider, 60)
+
+    async def fetch(self, provider: str):
+        try:
+            models = await self.fetchers[provider]()
+        except Exception as e:
+            logger.warning("Couldn't refresh %s models: %s", provider, e)
+            models = None
+        finally:
+            self.refreshing.pop(provider, None)
+        # Fetchers return None when the provider couldn't be reached
+        if models is not None or provider not in self.models:
+            self.models[provider] = models or []
+        self.fetched[provider] = time.monotonic()
+
+    def refresh(self, provider: str) -> asyncio.Task:
+        task = self.refreshing.get(provider)
+        if task is None:
+            task = self.refreshing[provider] = asyncio.create_task(
+                self.fetch(provider)
+            )
+        return task
+
+    async def get(self, provider: str):
+        if provider not in self.models:
+            await asyncio.shield(self.refresh(provider))
+        elif self.stale(provider):
+            self.refresh(provider)
+        return self.models[provider]
+
+    async def all(self) -> dict[str, Any]:
+        providers = list(self.fetchers)
+        models = await asyncio.gather(*[self.get(p) for p in providers])
+        return dict(zip(providers, models))
+
+    async def run(self):
+        while True:
+            stale = [p for p in self.fetchers if self.stale(p)]
+            if stale:
+                await asyncio.gather(
+                    *[self.refresh(p) for p in stale], return_exceptions=True
+                )
+            await asyncio.sleep(min(self.ttls.values(), default=60) / 2)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+
+def parse_ttls(spec: str, defaults: dict[str, float]) -> dict[str, float]:
+    ttls = dict(defaults)
+    for item in spec.split(","):
+        if "=" in item:
+            provider, seconds = item.rsplit("=", 1)
+            try:
+                ttls[provider.strip()] = float(seconds)
+            except ValueError:
+                logger.warning("Ignoring invalid model list TTL: %s", item)
+    return ttls
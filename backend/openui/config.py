@@ -25,6 +25,25 @@ except KeyError:
 default_db = Path.home() / ".openui" / "db.sqlite"
 default_db.parent.mkdir(exist_ok=True)
 DB = os.getenv("DATABASE", default_db)
+# Sessions expire after SESSION_MAX_AGE days and are purged in batches
+SESSION_MAX_AGE = float(os.getenv("OPENUI_SESSION_MAX_AGE", "7"))
+SESSION_PURGE_BATCH = int(os.getenv("OPENUI_SESSION_PURGE_BATCH", "500"))
+# Seconds between maintenance jobs, i.e. "checkpoint=60,vacuum=0", 0 disables a job
+MAINTENANCE = os.getenv("OPENUI_MAINTENANCE", "")
+MAINTENANCE_DELAY = float(os.getenv("OPENUI_MAINTENANCE_DELAY", "60"))
+# Workers on one machine take this lock, only the one holding it runs maintenance
+MAINTENANCE_LOCK = Path(
+    os.getenv("OPENUI_MAINTENANCE_LOCK", default_db.parent / "maintenance.lock")
+)
+# Seconds a resolved session is reused for, and how many are kept
+SESSION_CACHE_TTL = float(os.getenv("OPENUI_SESSION_CACHE_TTL", "5"))
+SESSION_CACHE_SIZE = int(os.getenv("OPENUI_SESSION_CACHE_SIZE", "1024"))
+# Threads with their own read only connection, writes always go through one
+DB_READERS = int(os.getenv("OPENUI_DB_READERS", "4"))
+# Connections per worker process when DATABASE is a Postgres URL, enough for
+# every reader and writer thread plus the one migrating at startup
+DB_POOL_SIZE = int(os.getenv("OPENUI_DB_POOL_SIZE", 2 * DB_READERS + 1))
+DB_MMAP_SIZE = int(os.getenv("OPENUI_DB_MMAP_SIZE", 256 * 1024 * 1024))
 HOST = os.getenv(
     "OPENUI_HOST",
     "https://localhost:5173" if ENV == Env.DEV else "http://localhost:7878",
@@ -45,6 +64,21 @@ if os.getenv("LITELLM_MASTER_KEY") is None:
 # GPT 3.5 is 0.0005 per 1k tokens input and 0.0015 output
 # 700k puts us at a max of $1.00 spent per user over a 48 hour period
 MAX_TOKENS = int(os.getenv("OPENUI_MAX_TOKENS", "700000"))
+# Per message token counts to memoize, prompts with more new text than this
+# many characters are encoded off the event loop
+TOKENIZER_CACHE_SIZE = int(os.getenv("OPENUI_TOKENIZER_CACHE_SIZE", "4096"))
+TOKENIZER_OFFLOAD_CHARS = int(os.getenv("OPENUI_TOKENIZER_OFFLOAD_CHARS", "16000"))
+# Where tiktoken keeps its BPE files, the Docker image prefetches them at build
+# time so the first chat request doesn't download them
+TIKTOKEN_CACHE_DIR = Path(
+    os.getenv("TIKTOKEN_CACHE_DIR", Path.home() / ".openui" / "tiktoken")
+)
+os.environ["TIKTOKEN_CACHE_DIR"] = str(TIKTOKEN_CACHE_DIR)
+# Users whose rolling usage window is kept in memory
+QUOTA_MAX_USERS = int(os.getenv("OPENUI_QUOTA_MAX_USERS", "10000"))
+# Usage is written behind the stream, in batches every interval or once this many rows are pending
+USAGE_FLUSH_INTERVAL = float(os.getenv("OPENUI_USAGE_FLUSH_INTERVAL", "5"))
+USAGE_FLUSH_SIZE = int(os.getenv("OPENUI_USAGE_FLUSH_SIZE", "100"))
 GITHUB_CLIENT_ID = os.getenv("GITHUB_CLIENT_ID")
 GITHUB_CLIENT_SECRET = os.getenv("GITHUB_CLIENT_SECRET")
 
@@ -52,6 +86,18 @@ AWS_ENDPOINT_URL_S3 = os.getenv("AWS_ENDPOINT_URL_S3")
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 BUCKET_NAME = os.getenv("BUCKET_NAME", "openui")
+# Shares are stored in "s3", with boto3's usual credential chain, or on the
+# local "filesystem" under STORAGE_DIR
+STORAGE = os.getenv("OPENUI_STORAGE", "s3")
+STORAGE_DIR = Path(os.getenv("OPENUI_STORAGE_DIR", Path.home() / ".openui" / "storage"))
+# Concurrent S3 requests, point AWS_ENDPOINT_URL_S3 at MinIO to test locally
+STORAGE_POOL_SIZE = int(os.getenv("OPENUI_STORAGE_POOL_SIZE", "16"))
+# Shares are cached in memory and on disk, sizes are in bytes, 0 disables a tier
+SHARE_CACHE_DIR = Path(
+    os.getenv("OPENUI_SHARE_CACHE_DIR", Path.home() / ".openui" / "shares")
+)
+SHARE_CACHE_MEMORY = int(os.getenv("OPENUI_SHARE_CACHE_MEMORY", 32 * 1024 * 1024))
+SHARE_CACHE_DISK = int(os.getenv("OPENUI_SHARE_CACHE_DISK", 512 * 1024 * 1024))
 
 # Cors, if you're hosting the annotator iframe elsewhere, add it here
 CORS_ORIGINS = os.getenv(
@@ -60,10 +106,75 @@ CORS_ORIGINS = os.getenv(
 
 # Model providers
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434")
+# Ollama models to load at startup and keep resident, and how long used models stay loaded
+OLLAMA_PRELOAD = [m for m in os.getenv("OPENUI_OLLAMA_PRELOAD", "").split(",") if m]
+OLLAMA_KEEP_ALIVE = os.getenv("OPENUI_OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_RESIDENCY_INTERVAL = float(os.getenv("OPENUI_OLLAMA_RESIDENCY_INTERVAL", "30"))
+# Bytes of decoded and resized vision images to keep around for multi turn sessions
+IMAGE_CACHE_MEMORY = int(os.getenv("OPENUI_IMAGE_CACHE_MEMORY", 64 * 1024 * 1024))
+# Screenshots sent to OpenAI compatible vision models are resized and re-encoded
+VISION_OPTIMIZE = os.getenv("OPENUI_VISION_OPTIMIZE", "true").lower() != "false"
+VISION_FORMAT = os.getenv("OPENUI_VISION_FORMAT", "webp").lower()
+if VISION_FORMAT == "jpg":
+    VISION_FORMAT = "jpeg"
+if VISION_FORMAT not in ("webp", "jpeg", "png"):
+    raise ValueError(
+        f"OPENUI_VISION_FORMAT must be webp, jpeg or png, not {VISION_FORMAT}"
+    )
+VISION_QUALITY = int(os.getenv("OPENUI_VISION_QUALITY", "90"))
 OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "xxx")
 GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 LITELLM_API_KEY = os.getenv("LITELLM_API_KEY", os.getenv("LITELLM_MASTER_KEY"))
 LITELLM_BASE_URL = os.getenv("LITELLM_BASE_URL", "http://0.0.0.0:4000")
+# Providers are probed every HEALTH_INTERVAL seconds, a provider's circuit opens after
+# BREAKER_FAILURES errors in a row or an error rate over BREAKER_ERROR_RATE in the last
+# BREAKER_WINDOW calls, and traffic is retried after BREAKER_COOLDOWN seconds
+HEALTH_INTERVAL = float(os.getenv("OPENUI_HEALTH_INTERVAL", "30"))
+HEALTH_TIMEOUT = float(os.getenv("OPENUI_HEALTH_TIMEOUT", "5"))
+BREAKER_FAILURES = int(os.getenv("OPENUI_BREAKER_FAILURES", "5"))
+BREAKER_ERROR_RATE = float(os.getenv("OPENUI_BREAKER_ERROR_RATE", "0.5"))
+BREAKER_WINDOW = int(os.getenv("OPENUI_BREAKER_WINDOW", "20"))
+BREAKER_COOLDOWN = float(os.getenv("OPENUI_BREAKER_COOLDOWN", "30"))
+# Seconds before a provider's model list is refreshed, i.e. "ollama=10,groq=300"
+MODELS_TTL = os.getenv("OPENUI_MODELS_TTL", "")
 PORT = int(os.getenv("PORT", 7878))
+# Server processes, set with --workers. Limits and in memory state are per worker.
+WORKERS = int(os.getenv("OPENUI_WORKERS", "1"))
+# How often quota is re-read from the database, needed when other workers write usage too
+QUOTA_SYNC_INTERVAL = float(
+    os.getenv("OPENUI_QUOTA_SYNC_INTERVAL", "30" if WORKERS > 1 else "0")
+)
+
+# Opt in cache of finished responses, used for temperature 0 requests or when
+# the client sends X-OpenUI-Cache: true. Hits are replayed instantly unless a
+# per frame delay (in seconds) is configured.
+RESPONSE_CACHE = os.getenv("OPENUI_RESPONSE_CACHE", "false").lower() == "true"
+RESPONSE_CACHE_DB = Path(
+    os.getenv("OPENUI_RESPONSE_CACHE_DB", default_db.parent / "cache.sqlite")
+)
+RESPONSE_CACHE_TTL = float(os.getenv("OPENUI_RESPONSE_CACHE_TTL", 60 * 60 * 24))
+RESPONSE_CACHE_MEMORY_SIZE = int(os.getenv("OPENUI_RESPONSE_CACHE_MEMORY_SIZE", "256"))
+RESPONSE_CACHE_DISK_SIZE = int(os.getenv("OPENUI_RESPONSE_CACHE_DISK_SIZE", "10000"))
+RESPONSE_CACHE_REPLAY_DELAY = float(os.getenv("OPENUI_RESPONSE_CACHE_REPLAY_DELAY", "0"))
+
+# Concurrent streams allowed per provider or model, i.e. "ollama=2,openai=64,ollama/llava=1".
+# Requests over the limit wait in a fair queue of QUEUE_SIZE for up to QUEUE_TIMEOUT seconds.
+CONCURRENCY = os.getenv("OPENUI_CONCURRENCY", "ollama=2")
+QUEUE_SIZE = int(os.getenv("OPENUI_QUEUE_SIZE", "32"))
+QUEUE_PER_USER = int(os.getenv("OPENUI_QUEUE_PER_USER", "4"))
+QUEUE_TIMEOUT = float(os.getenv("OPENUI_QUEUE_TIMEOUT", "60"))
+
+# Equivalent models to hedge or fail over between, i.e. "gpt-4o,litellm/gpt-4o;groq/llama3-70b-8192,ollama/llama3:70b".
+# A member that hasn't sent a first chunk within its budget (in seconds, per model or provider,
+# i.e. "groq=2,ollama=20") gets the next member started alongside it.
+MODEL_GROUPS = os.getenv("OPENUI_MODEL_GROUPS", "")
+TTFT_BUDGETS = os.getenv("OPENUI_TTFT_BUDGETS", "")
+TTFT_BUDGET = float(os.getenv("OPENUI_TTFT_BUDGET", "10"))
+
+# Share one upstream stream between identical requests that are in flight at once
+SINGLE_FLIGHT = os.getenv("OPENUI_SINGLE_FLIGHT", "true").lower() != "false"
+
+# Stream upstream SSE bytes straight through instead of re-serializing each chunk
+SSE_PASSTHROUGH = os.getenv("OPENUI_SSE_PASSTHROUGH", "true").lower() != "false"
@@ -0,0 +1,79 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+from peewee import SqliteDatabase
+from .models import database
+from openui import config
+
+T = TypeVar("T")
+
+
+def read_only():
+    # peewee keeps a connection per thread, readers get their own and can't write
+    if isinstance(database, SqliteDatabase):
+        database.connect(reuse_if_open=True)
+        database.execute_sql("PRAGMA query_only = 1")
+
+
+# SQLite only ever has one writer, funnelling writes through a single thread
+# means they queue here instead of spinning on busy_timeout. Postgres takes
+# concurrent writes, so it gets as many writers as readers.
+writer = ThreadPoolExecutor(
+    max_workers=1 if isinstance(database, SqliteDatabase) else config.DB_READERS,
+    thread_name_prefix="db-write",
+)
+readers = ThreadPoolExecutor(
+    max_workers=config.DB_READERS, thread_name_prefix="db-read", initializer=read_only
+)
+
+
+def pooled(fn: Callable[..., T], *args, **kwargs) -> T:
+    # A pooled connection goes back to the pool between calls, instead of
+    # staying checked out by an idle thread
+    with database.connection_context():
+        return fn(*args, **kwargs)
+
+
+def task(fn: Callable[..., T], *args, **kwargs) -> Callable[[], T]:
+    if isinstance(database, SqliteDatabase):
+        return functools.partial(fn, *args, **kwargs)
+    return functools.partial(pooled, fn, *args, **kwargs)
+
+
+async def run(executor: ThreadPoolExecutor, fn: Callable[..., T], *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, task(fn, *args, **kwargs)
+    )
+
+
+async def read(fn: Callable[..., T], *args, **kwargs) -> T:
+    """Runs fn on one of the read only connections, off the event loop"""
+    return await run(readers, fn, *args, **kwargs)
+
+
+async def write(fn: Callable[..., T], *args, **kwargs) -> T:
+    """Runs fn on the writer connection, off the event loop"""
+    return await run(writer, fn, *args, **kwargs)
+
+
+def prewarm():
+    """Opens the writer's connection and one reader's"""
+    readers.submit(task(database.execute_sql, "SELECT 1")).result()
+    writer.submit(task(database.execute_sql, "SELECT 1")).result()
+
+
+class Statement:
+    """SQL for a hot query, rendered by peewee once and re-executed with new params
+
+    Executing the same SQL text lets sqlite3's statement cache skip re-preparing.
+    """
+
+    def __init__(self, query_fn: Callable[[], Any]):
+        self.query_fn = query_fn
+        self.sql: str | None = None
+
+    def execute(self, *params) -> list[tuple]:
+        if self.sql is None:
+            self.sql, _ = self.query_fn().sql()
+        return database.execute_sql(self.sql, params).fetchall()
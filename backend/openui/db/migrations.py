@@ -0,0 +1,158 @@
+from dataclasses import dataclass
+from peewee import (
+    BooleanField,
+    CharField,
+    Database,
+    Field,
+    Model,
+    PostgresqlDatabase,
+    fn,
+)
+from playhouse.migrate import SchemaMigrator, migrate
+from .models import (
+    database,
+    User,
+    Credential,
+    Session,
+    Component,
+    SchemaMigration,
+    Usage,
+    Vote,
+)
+from ..logs import logger
+
+MODELS = [User, Credential, Session, Component, SchemaMigration, Usage, Vote]
+
+
+def quote(db: Database, name: str) -> str:
+    return f"{db.quote[0]}{name}{db.quote[1]}"
+
+
+class Op:
+    """One idempotent schema change, safe to re-run if a migration is interrupted"""
+
+    def apply(self, db: Database):
+        raise NotImplementedError
+
+
+class AddColumn(Op):
+    def __init__(self, table: str, name: str, field: Field):
+        self.table = table
+        self.name = name
+        self.field = field
+
+    def apply(self, db: Database):
+        if self.name in {column.name for column in db.get_columns(self.table)}:
+            return
+        migrator = SchemaMigrator.from_database(db)
+        migrate(migrator.add_column(self.table, self.name, self.field))
+
+
+class CreateTables(Op):
+    def __init__(self, *models: type[Model]):
+        self.models = models
+
+    def apply(self, db: Database):
+        db.create_tables(self.models, safe=True)
+
+
+class CreateIndex(Op):
+    """Builds an index if it's missing, without blocking writes on Postgres"""
+
+    def __init__(self, table: str, columns: list[str], unique: bool = False):
+        self.table = table
+        self.columns = columns
+        self.unique = unique
+        # Matches peewee's naming, so indexes it already made aren't duplicated
+        self.name = "_".join([table, *columns])
+
+    def apply(self, db: Database):
+        concurrently = " CONCURRENTLY" if isinstance(db, PostgresqlDatabase) else ""
+        columns = ", ".join(quote(db, column) for column in self.columns)
+        db.execute_sql(
+            f"CREATE {'UNIQUE ' if self.unique else ''}INDEX{concurrently} "
+            f"IF NOT EXISTS {quote(db, self.name)} "
+            f"ON {quote(db, self.table)} ({columns})"
+        )
+
+
+class Backfill(Op):
+    """Updates rows matching where in chunks, each in its own transaction
+
+    The update has to stop rows matching where, and the model needs a
+    single column primary key.
+    """
+
+    def __init__(self, model: type[Model], update: dict, where, chunk_size=1000):
+        self.model = model
+        self.update = update
+        self.where = where
+        self.chunk_size = chunk_size
+
+    def apply(self, db: Database):
+        pk = self.model._meta.primary_key
+        while True:
+            chunk = self.model.select(pk).where(self.where).limit(self.chunk_size)
+            with db.atomic():
+                updated = (
+                    self.model.update(self.update).where(pk.in_(chunk)).execute()
+                )
+            if updated < self.chunk_size:
+                break
+
+
+@dataclass
+class Migration:
+    version: str
+    ops: list[Op]
+
+
+# Versions sort in the order they're applied, append new migrations at the end
+MIGRATIONS = [
+    Migration(
+        "2024-03-12",
+        [
+            AddColumn("credential", "aaguid", CharField(null=True)),
+            AddColumn("credential", "user_verified", BooleanField(default=False)),
+        ],
+    ),
+    Migration("2024-05-14", [CreateTables(Vote)]),
+    Migration("2026-10-18", [CreateIndex("session", ["created_at"])]),
+    Migration(
+        "2026-10-18.1",
+        [
+            CreateIndex("vote", ["user_id"]),
+            CreateIndex("component", ["user_id"]),
+            CreateIndex("session", ["user_id"]),
+            CreateIndex("user", ["email"]),
+            # Quota seeding sums a user's recent days straight from the index
+            CreateIndex(
+                "usage", ["user_id", "day", "input_tokens", "output_tokens"]
+            ),
+        ],
+    ),
+]
+
+
+def current_version() -> str | None:
+    if not SchemaMigration.table_exists():
+        return None
+    return SchemaMigration.select(fn.MAX(SchemaMigration.version)).scalar()
+
+
+def ensure_migrated(db: Database = database):
+    """Applies every migration newer than the latest one recorded"""
+    version = current_version()
+    if version == MIGRATIONS[-1].version:
+        return
+    if version is None:
+        # A new database gets current tables, the migrations below only add
+        # what the models don't declare
+        db.create_tables(MODELS, safe=True)
+    for migration in MIGRATIONS:
+        if version is not None and migration.version <= version:
+            continue
+        for op in migration.ops:
+            op.apply(db)
+        SchemaMigration.create(version=migration.version)
+        logger.info("Applied migration %s", migration.version)
@@ -1,5 +1,6 @@
 from peewee import (
     Model,
+    TextField,
     BinaryUUIDField,
     BooleanField,
     CharField,
@@ -8,24 +9,62 @@ from peewee import (
     CompositeKey,
     DateTimeField,
     ForeignKeyField,
-    OperationalError,
     fn,
 )
+import json
 import uuid
 import datetime
-from playhouse.sqlite_ext import SqliteExtDatabase, JSONField
-from playhouse.migrate import SqliteMigrator, migrate
+from playhouse.db_url import connect
 from openui import config
 
-database = SqliteExtDatabase(
-    config.DB,
-    pragmas=(
-        ("cache_size", -1024 * 64),  # 64MB page-cache.
-        ("journal_mode", "wal"),  # Use WAL-mode
-        ("foreign_keys", 1),
-    ),
+SQLITE_PRAGMAS = (
+    ("cache_size", -1024 * 64),  # 64MB page-cache.
+    ("journal_mode", "wal"),  # Use WAL-mode
+    ("foreign_keys", 1),
+    ("busy_timeout", 5000),  # Wait on other workers' writes
+    ("synchronous", "normal"),  # Safe with WAL, fsyncs only on checkpoints
+    ("mmap_size", config.DB_MMAP_SIZE),
+    ("temp_store", "memory"),
+    # Lets maintenance hand free pages back a few at a time
+    ("auto_vacuum", "incremental"),
 )
-migrator = SqliteMigrator(database)
+
+
+def connect_database(url: str):
+    """DATABASE is a file path for SQLite or any playhouse.db_url URL
+
+    Postgres URLs always get a connection pool.
+    """
+    url = str(url)
+    if "://" not in url:
+        url = f"sqliteext:///{url}"
+    scheme, rest = url.split("://", 1)
+    if scheme.startswith("sqlite"):
+        # Keep prepared statements for every query shape we run
+        return connect(url, pragmas=SQLITE_PRAGMAS, cached_statements=256)
+    if scheme in ("postgres", "postgresql", "postgresext", "postgresqlext"):
+        url = f"postgresext+pool://{rest}"
+    return connect(
+        url, max_connections=config.DB_POOL_SIZE, stale_timeout=300, timeout=10
+    )
+
+
+database = connect_database(config.DB)
+
+
+class JSONField(TextField):
+    """JSON stored as text, a json column on Postgres"""
+
+    field_type = "JSON"
+
+    def db_value(self, value):
+        return None if value is None else json.dumps(value)
+
+    def python_value(self, value):
+        # Postgres drivers already decode json columns
+        if isinstance(value, (str, bytes)):
+            return json.loads(value)
+        return value
 
 
 class BaseModel(Model):
@@ -57,7 +96,7 @@ class Session(BaseModel):
     id = BinaryUUIDField(primary_key=True)
     user = ForeignKeyField(User, backref="sessions")
     data = JSONField()
-    created_at = DateTimeField()
+    created_at = DateTimeField(index=True)
     updated_at = DateTimeField()
 
 
@@ -111,54 +150,3 @@ class Usage(BaseModel):
             .tokens
             or 0
         )
-
-
-CURRENT_VERSION = "2024-05-14"
-
-
-def alter(schema: SchemaMigration, ops: list[list], version: str) -> bool:
-    try:
-        migrate(*ops)
-    except OperationalError as e:
-        print("Migration failed", e)
-        return False
-    schema.version = version
-    schema.save()
-    print(f"Migrated {version}")
-    return version != CURRENT_VERSION
-
-
-def perform_migration(schema: SchemaMigration) -> bool:
-    if schema.version == "2024-03-08":
-        version = "2024-03-12"
-        aaguid = CharField(null=True)
-        user_verified = BooleanField(default=False)
-        altered = alter(
-            schema,
-            [
-                migrator.add_column("credential", "aaguid", aaguid),
-                migrator.add_column("credential", "user_verified", user_verified),
-            ],
-            version,
-        )
-        if altered:
-            perform_migration(schema)
-    if schema.version == "2024-03-12":
-        version = "2024-05-14"
-        database.create_tables([Vote])
-        schema.version = version
-        schema.save()
-        if version != CURRENT_VERSION:
-            perform_migration(schema)
-
-
-def ensure_migrated():
-    if not config.DB.exists():
-        database.create_tables(
-            [User, Credential, Session, Component, SchemaMigration, Usage, Vote]
-        )
-        SchemaMigration.create(version=CURRENT_VERSION)
-    else:
-        schema = SchemaMigration.select().first()
-        if schema.version != CURRENT_VERSION:
-            perform_migration(schema)
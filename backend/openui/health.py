@@ -0,0 +1,148 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable
+from fastapi import HTTPException
+from openai import APIStatusError
+from .logs import logger
+from . import config
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def is_failure(e: BaseException) -> bool:
+    """Whether an error means the provider is unhealthy, rather than the request bad"""
+    status_code = getattr(e, "status_code", None)
+    if isinstance(e, APIStatusError) or isinstance(status_code, int):
+        return status_code >= 500
+    return True
+
+
+class CircuitBreaker:
+    """Tracks a provider's recent outcomes and stops traffic to it when it's failing
+
+    The breaker opens after `failures` consecutive errors, or when more than
+    `error_rate` of the last `window` calls failed. After `cooldown` seconds
+    one trial request is let through, its outcome closes or re-opens it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.outcomes: deque[bool] = deque(maxlen=config.BREAKER_WINDOW)
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_at = 0.0
+        self.latency: float | None = None
+        self.last_error: str | None = None
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == OPEN and now - self.opened_at >= config.BREAKER_COOLDOWN:
+            self.state = HALF_OPEN
+        # Only one trial at a time, unless the last one never reported back
+        if self.state == HALF_OPEN and now - self.trial_at >= config.BREAKER_COOLDOWN:
+            self.trial_at = now
+            return True
+        return False
+
+    def retry_after(self) -> int:
+        remaining = config.BREAKER_COOLDOWN - (time.monotonic() - self.opened_at)
+        return max(1, math.ceil(remaining))
+
+    def success(self, latency: float):
+        self.outcomes.append(True)
+        self.consecutive_failures = 0
+        self.latency = latency if self.latency is None else (
+            0.8 * self.latency + 0.2 * latency
+        )
+        if self.state != CLOSED:
+            logger.info("%s is healthy again", self.name)
+            self.state = CLOSED
+
+    def failure(self, error: BaseException):
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        self.last_error = str(error) or type(error).__name__
+        failing = self.consecutive_failures >= config.BREAKER_FAILURES or (
+            len(self.outcomes) >= config.BREAKER_WINDOW / 2
+            and self.error_rate() > config.BREAKER_ERROR_RATE
+        )
+        if self.state == HALF_OPEN or (self.state == CLOSED and failing):
+            if self.state == CLOSED:
+                logger.warning("%s is failing, opening circuit: %s", self.name, error)
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "error_rate": round(self.error_rate(), 3),
+            "latency_ms": None if self.latency is None else round(self.latency * 1000),
+            "last_error": self.last_error,
+        }
+
+
+class HealthMonitor:
+    """Circuit breakers for each provider, fed by real traffic and background probes"""
+
+    def __init__(self, probes: dict[str, Callable[[], Awaitable]]):
+        self.probes = probes
+        self.breakers = {name: CircuitBreaker(name) for name in probes}
+        self.task: asyncio.Task | None = None
+
+    def check(self, provider: str):
+        """Fails fast with a 503 when a provider's circuit is open"""
+        breaker = self.breakers.get(provider)
+        if breaker is not None and not breaker.allow():
+            raise HTTPException(
+                status_code=503,
+                detail=f"{provider} is currently unavailable, please try again shortly.",
+                headers={"Retry-After": str(breaker.retry_after())},
+            )
+
+    def success(self, provider: str, latency: float):
+        if provider in self.breakers:
+            self.breakers[provider].success(latency)
+
+    def failure(self, provider: str, error: BaseException):
+        if provider in self.breakers and is_failure(error):
+            self.breakers[provider].failure(error)
+
+    async def probe(self, provider: str):
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(self.probes[provider](), config.HEALTH_TIMEOUT)
+        except Exception as e:
+            # A 4xx still means the provider is up
+            if is_failure(e):
+                self.breakers[provider].failure(e)
+                return
+        self.breakers[provider].success(time.monotonic() - start)
+
+    async def run(self):
+        while True:
+            await asyncio.gather(*[self.probe(p) for p in self.probes])
+            await asyncio.sleep(config.HEALTH_INTERVAL)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def stats(self) -> dict:
+        return {name: breaker.stats() for name, breaker in self.breakers.items()}
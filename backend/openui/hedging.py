@@ -0,0 +1,146 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable
+from fastapi import HTTPException
+from openai import APIConnectionError, APIStatusError
+from .logs import logger
+from . import config
+
+Opener = Callable[[str], Awaitable[tuple[AsyncIterator[bytes], int]]]
+
+stats = {"hedged": 0, "failed_over": 0, "cancelled": 0}
+
+
+def parse_groups(spec: str) -> list[list[str]]:
+    """Parses "gpt-4o,litellm/gpt-4o;groq/llama3-70b-8192,ollama/llama3:70b" """
+    groups = []
+    for group in spec.split(";"):
+        members = [m.strip() for m in group.split(",") if m.strip()]
+        if len(members) > 1:
+            groups.append(members)
+    return groups
+
+
+def parse_budgets(spec: str) -> dict[str, float]:
+    budgets = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, seconds = item.rsplit("=", 1)
+            budgets[name.strip()] = float(seconds)
+    return budgets
+
+
+groups = parse_groups(config.MODEL_GROUPS)
+budgets = parse_budgets(config.TTFT_BUDGETS)
+
+
+def candidates(model: str) -> list[str]:
+    """The model followed by the rest of its equivalence group, in group order"""
+    for group in groups:
+        if model in group:
+            i = group.index(model)
+            return group[i:] + group[:i]
+    return [model]
+
+
+def ttft_budget(model: str) -> float:
+    """Seconds to wait for a first chunk before hedging with the next model"""
+    provider = "openai" if model.startswith("gpt") else model.split("/")[0]
+    return budgets.get(model, budgets.get(provider, config.TTFT_BUDGET))
+
+
+def is_retriable(e: BaseException) -> bool:
+    if isinstance(e, APIStatusError):
+        return e.status_code == 429 or e.status_code >= 500
+    if isinstance(e, HTTPException):
+        return e.status_code in (429, 500, 503)
+    return isinstance(e, APIConnectionError)
+
+
+async def prepend(first: bytes, chunks: AsyncIterator[bytes]):
+    yield first
+    async for chunk in chunks:
+        yield chunk
+
+
+async def first_chunk(model: str, open_model: Opener):
+    chunks, multiplier = await open_model(model)
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = b""
+    except BaseException:
+        await chunks.aclose()
+        raise
+    return chunks, multiplier, first
+
+
+async def discard(task: asyncio.Task):
+    """Cancels a losing attempt, closing its stream if it already has one"""
+    stats["cancelled"] += 1
+    task.cancel()
+    try:
+        chunks, _, _ = await task
+    except BaseException:
+        return
+    await chunks.aclose()
+
+
+async def hedged_open(model: str, open_model: Opener):
+    """Opens the first of model's group to produce a chunk
+
+    Each member gets its time to first token budget before the next member
+    is started alongside it, and members that fail with a 429, 5xx or
+    connection error are replaced right away. Only the winning stream is
+    returned, every other attempt is cancelled.
+    """
+    members = candidates(model)
+    if len(members) == 1:
+        return await open_model(model)
+    attempts: dict[asyncio.Task, str] = {}
+    error: BaseException | None = None
+    launched = 0
+
+    def launch():
+        nonlocal launched
+        member = members[launched]
+        launched += 1
+        attempts[asyncio.create_task(first_chunk(member, open_model))] = member
+        return member
+
+    latest = launch()
+    try:
+        while attempts:
+            timeout = ttft_budget(latest) if launched < len(members) else None
+            done, _ = await asyncio.wait(
+                attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                stats["hedged"] += 1
+                logger.info("No first token from %s yet, hedging", latest)
+                latest = launch()
+                continue
+            winner = None
+            for task in done:
+                member = attempts.pop(task)
+                if task.exception() is None:
+                    if winner is None:
+                        winner = (member, task.result())
+                    else:
+                        await task.result()[0].aclose()
+                    continue
+                error = task.exception()
+                if not is_retriable(error):
+                    raise error
+                logger.warning("%s failed, failing over: %s", member, error)
+            if winner is not None:
+                member, (chunks, multiplier, first) = winner
+                if member != model:
+                    logger.info("Serving %s with %s", model, member)
+                return prepend(first, chunks), multiplier
+            if launched < len(members):
+                stats["failed_over"] += 1
+                latest = launch()
+        raise error
+    finally:
+        for task in attempts:
+            await discard(task)
@@ -0,0 +1,153 @@
+import base64
+import hashlib
+from io import BytesIO
+from .logs import logger
+from .util.cache import LRUCache
+from . import config
+
+try:
+    from PIL import Image
+except ImportError:
+    # Install OpenUI with pip install .[vision] to resize images
+    Image = None
+
+# The resolution vision models encode images at, anything bigger is wasted
+OLLAMA_VISION_SIZES = {
+    "llava": 672,
+    "bakllava": 336,
+    "moondream": 378,
+    "minicpm-v": 448,
+    "llama3.2-vision": 1120,
+}
+DEFAULT_VISION_SIZE = 1024
+
+ollama_images = LRUCache(config.IMAGE_CACHE_MEMORY, sizeof=len)
+
+
+def url_digest(url: str) -> bytes:
+    return hashlib.sha256(url.encode("utf-8")).digest()
+
+
+def decode_data_url(url: str) -> bytes:
+    return base64.b64decode(url.split(",")[-1])
+
+
+def ollama_vision_size(model: str) -> int:
+    for prefix, size in OLLAMA_VISION_SIZES.items():
+        if model.startswith(prefix):
+            return size
+    return DEFAULT_VISION_SIZE
+
+
+def downscale(raw: bytes, max_side: int) -> bytes:
+    """Shrinks an image to fit in a max_side square, re-encoding it if needed"""
+    if Image is None or len(raw) == 0:
+        return raw
+    try:
+        image = Image.open(BytesIO(raw))
+        if max(image.size) <= max_side:
+            return raw
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        out = BytesIO()
+        if image.mode in ("RGBA", "LA", "P"):
+            image.save(out, format="PNG", optimize=True)
+        else:
+            image.convert("RGB").save(out, format="JPEG", quality=90)
+        return out.getvalue()
+    except Exception as e:
+        logger.warning("Couldn't resize image, sending it as is: %s", e)
+        return raw
+
+
+def ollama_image(url: str, model: str) -> bytes:
+    """Decodes and resizes an image for an Ollama vision model, cached by content"""
+    size = ollama_vision_size(model)
+    key = (url_digest(url), size)
+    image = ollama_images.get(key)
+    if image is None:
+        image = downscale(decode_data_url(url), size)
+        ollama_images.set(key, image)
+    return image
+
+
+# OpenAI scales images to fit 2048x2048 and then to 768px on the short side
+# before cutting 512px tiles, other providers (Claude, Gemini via LiteLLM)
+# get nothing from images bigger than ~1568px on the long side
+OPENAI_VISION_SIZE = (2048, 768)
+DEFAULT_VISION_LIMITS = (1568, 1568)
+LOW_DETAIL_SIDE = 512
+
+optimized_images = LRUCache(
+    config.IMAGE_CACHE_MEMORY, sizeof=lambda optimized: len(optimized[0])
+)
+
+
+def vision_limits(model: str) -> tuple[int, int]:
+    """Max (long side, short side) of an image a model will actually look at"""
+    name = model.split("/")[-1]
+    if name.startswith(("gpt", "o1", "o3", "o4", "chatgpt")):
+        return OPENAI_VISION_SIZE
+    return DEFAULT_VISION_LIMITS
+
+
+def optimize_image(url: str, model: str, detail: str | None) -> tuple[str, str]:
+    """Resizes and re-encodes a data URL image, picking a detail level for it"""
+    max_long, max_short = (
+        (LOW_DETAIL_SIDE, LOW_DETAIL_SIDE) if detail == "low" else vision_limits(model)
+    )
+    raw = decode_data_url(url)
+    image = Image.open(BytesIO(raw))
+    width, height = image.size
+    scale = min(1, max_long / max(width, height), max_short / min(width, height))
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    if detail is None or detail == "auto":
+        # Low detail shows the model a 512px image for a fraction of the tokens
+        detail = "low" if max(size) <= LOW_DETAIL_SIDE else "high"
+    if scale < 1:
+        image = image.resize(size, Image.LANCZOS)
+    out = BytesIO()
+    fmt = config.VISION_FORMAT
+    if fmt == "jpeg":
+        image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA")
+    image.save(out, format=fmt, quality=config.VISION_QUALITY)
+    if scale == 1 and out.tell() >= len(raw):
+        return url, detail
+    encoded = base64.b64encode(out.getvalue()).decode("ascii")
+    return f"data:image/{fmt};base64,{encoded}", detail
+
+
+def optimize_images(messages: list, model: str) -> list:
+    """Rewrites the data URL images in OpenAI style messages in place"""
+    for message in messages:
+        if isinstance(message.get("content"), str):
+            continue
+        for part in message.get("content") or []:
+            if part.get("type") != "image_url":
+                continue
+            image_url = part["image_url"]
+            url = image_url.get("url", "")
+            if not url.startswith("data:"):
+                continue
+            detail = image_url.get("detail")
+            key = (url_digest(url), model, detail)
+            optimized = optimized_images.get(key)
+            if optimized is None:
+                try:
+                    optimized = optimize_image(url, model, detail)
+                except Exception as e:
+                    logger.warning("Couldn't optimize image, sending it as is: %s", e)
+                    optimized = (url, detail or "auto")
+                optimized_images.set(key, optimized)
+            image_url["url"], image_url["detail"] = optimized
+    return messages
+
+
+def has_images(messages: list) -> bool:
+    return any(
+        part.get("type") == "image_url"
+        for message in messages
+        if not isinstance(message.get("content"), str)
+        for part in message.get("content") or []
+    )
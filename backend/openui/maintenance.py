@@ -0,0 +1,180 @@
+import asyncio
+import time
+from pathlib import Path
+from typing import IO, Awaitable, Callable
+from peewee import SqliteDatabase
+from .db import access
+from .db.models import database
+from .session import purge_expired_sessions
+from .logs import logger
+from . import config
+
+# Pages returned to the filesystem per incremental vacuum, 4MB with 4k pages
+VACUUM_PAGES = 1024
+vacuum_warned = False
+
+
+class Job:
+    def __init__(self, name: str, interval: float, run: Callable[[], Awaitable]):
+        self.name = name
+        self.interval = interval
+        self.run = run
+        # Let startup settle before the first run
+        self.next_run = time.monotonic() + min(interval, config.MAINTENANCE_DELAY)
+        self.runs = 0
+        self.failures = 0
+        self.last_duration: float | None = None
+        self.last_error: str | None = None
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_duration_ms": None
+            if self.last_duration is None
+            else round(self.last_duration * 1000, 1),
+            "last_error": self.last_error,
+        }
+
+
+def lock_file(path: Path) -> IO | None:
+    """Locks path for as long as the returned file is open, None if it's taken"""
+    try:
+        import fcntl
+    except ImportError:
+        # No flock on Windows, where we only run a single worker anyway
+        return open(path, "a")
+    f = open(path, "a")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+class Maintenance:
+    """Runs periodic database upkeep, one job at a time on the writer thread
+
+    With several workers only the one holding lock_path runs jobs. When it
+    exits the lock is released and its replacement takes over.
+    """
+
+    def __init__(self, jobs: list[Job], lock_path: Path):
+        self.jobs = jobs
+        self.lock_path = lock_path
+        self.lock: IO | None = None
+        self.task: asyncio.Task | None = None
+
+    async def run_job(self, job: Job):
+        start = time.monotonic()
+        try:
+            await job.run()
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e)
+            logger.exception("Maintenance job %s failed: %s", job.name, e)
+        else:
+            job.last_error = None
+        job.runs += 1
+        job.last_duration = time.monotonic() - start
+        job.next_run = time.monotonic() + job.interval
+        logger.debug("Ran %s in %.1fms", job.name, job.last_duration * 1000)
+
+    async def run(self):
+        while True:
+            job = min(self.jobs, key=lambda job: job.next_run)
+            await asyncio.sleep(max(0, job.next_run - time.monotonic()))
+            await self.run_job(job)
+
+    def start(self):
+        if self.task is not None or not self.jobs:
+            return
+        self.lock = lock_file(self.lock_path)
+        if self.lock is None:
+            logger.debug("Maintenance is running in another worker")
+            return
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        if self.lock is not None:
+            self.lock.close()
+            self.lock = None
+
+    def stats(self) -> dict:
+        return {job.name: job.stats() for job in self.jobs}
+
+
+def parse_intervals(spec: str, defaults: dict[str, float]) -> dict[str, float]:
+    intervals = dict(defaults)
+    for item in spec.split(","):
+        if "=" in item:
+            name, seconds = item.rsplit("=", 1)
+            intervals[name.strip()] = float(seconds)
+    return intervals
+
+
+async def purge_sessions():
+    # Small batches so chat usage writes aren't stuck behind one big delete
+    while await access.write(purge_expired_sessions, config.SESSION_PURGE_BATCH):
+        await asyncio.sleep(0)
+
+
+def checkpoint():
+    database.execute_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def optimize():
+    database.execute_sql("PRAGMA optimize")
+
+
+def incremental_vacuum_enabled() -> bool:
+    (auto_vacuum,) = database.execute_sql("PRAGMA auto_vacuum").fetchone()
+    return auto_vacuum == 2
+
+
+def enable_incremental_vacuum():
+    """Rewrites the whole database so auto_vacuum takes effect
+
+    This holds an exclusive lock and needs up to twice the database's size
+    in free disk, so it's only run by hand with python -m openui --vacuum.
+    """
+    database.execute_sql("PRAGMA auto_vacuum = INCREMENTAL")
+    database.execute_sql("VACUUM")
+
+
+def vacuum():
+    global vacuum_warned
+    if incremental_vacuum_enabled():
+        database.execute_sql(f"PRAGMA incremental_vacuum({VACUUM_PAGES})")
+    elif not vacuum_warned:
+        # Databases created before auto_vacuum was set need a full vacuum first
+        vacuum_warned = True
+        logger.warning(
+            "Incremental vacuum isn't enabled, stop the server and run "
+            "python -m openui --vacuum to reclaim free space"
+        )
+
+
+def maintenance_jobs() -> list[Job]:
+    intervals = parse_intervals(
+        config.MAINTENANCE,
+        {"sessions": 3600, "checkpoint": 300, "optimize": 21600, "vacuum": 3600},
+    )
+    jobs = [Job("sessions", intervals["sessions"], purge_sessions)]
+    if isinstance(database, SqliteDatabase):
+        # Postgres does all of this itself with autovacuum
+        for name, fn in (
+            ("checkpoint", checkpoint),
+            ("optimize", optimize),
+            ("vacuum", vacuum),
+        ):
+            jobs.append(Job(name, intervals[name], lambda fn=fn: access.write(fn)))
+    return [job for job in jobs if job.interval > 0]
+
+
+maintenance = Maintenance(maintenance_jobs(), config.MAINTENANCE_LOCK)
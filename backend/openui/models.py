@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-import tiktoken
+from .tokenizer import count_tokens  # noqa: F401
 
 
 class ShareRequest(BaseModel):
@@ -16,18 +16,3 @@ class VoteRequest(BaseModel):
     html: str
     vote: bool
 
-
-def count_tokens(messages):
-    """Returns the number of tokens in a text string."""
-    # TODO: we're just assuming the most recent encoding
-    encoding = tiktoken.get_encoding("cl100k_base")
-    text = ""
-    for message in messages:
-        if isinstance(message["content"], str):
-            text += message["content"]
-        else:
-            text += " ".join(
-                [part["text"] for part in message["content"] if part["type"] == "text"]
-            )
-    num_tokens = len(encoding.encode(text))
-    return num_tokens
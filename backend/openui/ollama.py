@@ -1,10 +1,10 @@
 import asyncio
-import base64
 import uuid
 import traceback
 import time
 from openai.types.chat import ChatCompletionChunk
 from .logs import logger
+from .images import ollama_image
 
 date_format = "%Y-%m-%dT%H:%M:%S.%fZ"
 # 🥱 three minutes
@@ -51,9 +51,7 @@ def openai_to_ollama(data):
                 if part["type"] == "text":
                     content["content"] = part["text"]
                 if part["type"] == "image_url":
-                    url = part["image_url"]["url"]
-                    b64 = url.split(",")[-1]
-                    bites = base64.b64decode(b64)
+                    bites = ollama_image(part["image_url"]["url"], data["model"])
                     if len(bites) > 0:
                         content["images"].append(bites)
             if len(content["images"]) == 0:
@@ -99,3 +97,94 @@ async def ollama_stream_generator(response, inputs):
             yield f"error: {str(e)}"  # ResponseError(f"Error: something weird", 400)
 
     return generator
+
+
+def model_tag(model: str) -> str:
+    return model if ":" in model else f"{model}:latest"
+
+
+class OllamaResidency:
+    """Preloads Ollama models, tracks which are resident and keeps hot ones loaded
+
+    Residency comes from the `ps` API and is refreshed every `interval`
+    seconds. Models are kept loaded by sending an empty generate request with
+    a keep_alive hint, which loads a cold model and extends a warm one.
+    """
+
+    def __init__(self, client, preload: list[str], keep_alive: str, interval: float):
+        self.client = client
+        self.preload = [model_tag(m) for m in preload]
+        self.keep_alive = keep_alive
+        self.interval = interval
+        self.resident: dict[str, float] = {}
+        self.touched: dict[str, float] = {}
+        self.task: asyncio.Task | None = None
+        # Loads started by touch, referenced until they finish so they aren't
+        # garbage collected mid request
+        self.loading: set[asyncio.Task] = set()
+        self.reachable = True
+
+    def is_resident(self, model: str) -> bool:
+        return model_tag(model) in self.resident
+
+    async def refresh(self):
+        try:
+            response = await self.client.ps()
+            resident = {
+                m.model: m.expires_at.timestamp() if m.expires_at else 0
+                for m in response.models
+            }
+        except Exception as e:
+            if self.reachable:
+                logger.debug("Couldn't list resident Ollama models: %s", e)
+            self.reachable = False
+            self.resident = {}
+            return
+        self.reachable = True
+        self.resident = resident
+
+    async def load(self, model: str):
+        model = model_tag(model)
+        self.touched[model] = time.monotonic()
+        try:
+            start = time.monotonic()
+            await self.client.generate(
+                model=model, prompt="", keep_alive=self.keep_alive
+            )
+            if model not in self.resident:
+                logger.info(
+                    "Loaded Ollama model %s in %.1fs", model, time.monotonic() - start
+                )
+                self.resident[model] = 0
+        except Exception as e:
+            logger.warning("Couldn't load Ollama model %s: %s", model, e)
+
+    def touch(self, model: str):
+        """Extends the keep_alive of a model that was just used, at most once an interval"""
+        model = model_tag(model)
+        if time.monotonic() - self.touched.get(model, 0) > self.interval:
+            self.touched[model] = time.monotonic()
+            task = asyncio.create_task(self.load(model))
+            self.loading.add(task)
+            task.add_done_callback(self.loading.discard)
+
+    async def run(self):
+        for model in self.preload:
+            await self.load(model)
+        while True:
+            await self.refresh()
+            # Preloaded models are pinned, bring them back if they were evicted
+            if self.reachable:
+                for model in self.preload:
+                    if model not in self.resident:
+                        await self.load(model)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
@@ -1,26 +1,91 @@
 import json
+from typing import AsyncIterator
 from openai import AsyncStream
 from openai.types.chat import (
     ChatCompletionChunk,
 )
-from .db.models import Usage
+from .usage import record_usage
+from .response_cache import response_cache
+from . import config
 
+DONE = b"data: [DONE]\n\n"
 
-async def openai_stream_generator(
+
+class SSEScanner:
+    """Scans raw SSE bytes just far enough to count data frames and spot [DONE]"""
+
+    def __init__(self):
+        self.partial = b""
+        self.frames = 0
+        self.done = False
+
+    def feed(self, data: bytes):
+        # JSON payloads never contain a raw newline, so every complete line is
+        # either a data: field, another SSE field, or a frame separator
+        lines = (self.partial + data).split(b"\n")
+        self.partial = lines.pop()
+        for line in lines:
+            if line.startswith(b"data:"):
+                if line[5:].strip() == b"[DONE]":
+                    self.done = True
+                else:
+                    self.frames += 1
+
+
+async def upstream_chunks(
+    subscription: AsyncStream[ChatCompletionChunk],
+) -> AsyncIterator[bytes]:
+    """Yields the SSE bytes to forward for an upstream stream
+
+    Streams traced by weave come back wrapped, and the trace only gets its
+    output from chunks read through the wrapper, so those are re-serialized.
+    """
+    if config.SSE_PASSTHROUGH and isinstance(subscription, AsyncStream):
+        # Forward the upstream frames untouched
+        try:
+            async for chunk in subscription.response.aiter_bytes():
+                yield chunk
+        finally:
+            await subscription.response.aclose()
+    else:
+        async for chunk in subscription:
+            yield f"data: {json.dumps(chunk.model_dump(exclude_unset=True))}\n\n".encode(
+                "utf-8"
+            )
+        yield DONE
+
+
+async def sse_stream_generator(
+    chunks: AsyncIterator[bytes],
+    input_tokens: int,
+    user_id: str,
+    multiplier: int = 1,
+    cache_key: str | None = None,
+):
+    # Everything we send is recorded when the response should be cached
+    recorded = [] if cache_key else None
+    # One data frame is one token
+    scanner = SSEScanner()
+    async for chunk in chunks:
+        scanner.feed(chunk)
+        if recorded is not None:
+            recorded.append(chunk)
+        yield chunk
+    # Upstreams that error mid stream never send [DONE], don't cache those
+    if not scanner.done:
+        yield DONE
+    record_usage(user_id, input_tokens * multiplier, scanner.frames * multiplier)
+    if scanner.done and recorded is not None:
+        await response_cache.put(cache_key, b"".join(recorded))
+
+
+def openai_stream_generator(
     subscription: AsyncStream[ChatCompletionChunk],
     input_tokens: int,
     user_id: str,
     multiplier: int = 1,
+    cache_key: str | None = None,
 ):
-    # async for chunk in subscription.response.aiter_bytes():
-    #    yield chunk
-    output_tokens = 0
-    async for chunk in subscription:
-        output_tokens += 1
-        yield f"data: {json.dumps(chunk.model_dump(exclude_unset=True))}\n\n"
-    Usage.update_tokens(
-        user_id=user_id,
-        input_tokens=input_tokens * multiplier,
-        output_tokens=output_tokens * multiplier,
+    return sse_stream_generator(
+        upstream_chunks(subscription), input_tokens, user_id, multiplier, cache_key
     )
-    yield "data: [DONE]\n\n"
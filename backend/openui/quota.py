@@ -0,0 +1,113 @@
+import datetime
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from .db.access import Statement
+from .db.models import Usage
+from . import config
+
+WINDOW_HOURS = 24
+
+
+def current_hour() -> int:
+    return int(time.time() // 3600)
+
+
+recent_usage = Statement(
+    lambda: Usage.select(Usage.day, Usage.input_tokens + Usage.output_tokens).where(
+        Usage.user_id == uuid.UUID(int=0), Usage.day >= datetime.date.min
+    )
+)
+
+
+class QuotaEngine:
+    """Tracks per user token usage over an exact rolling 24 hour window
+
+    Usage is kept in hourly buckets in memory and updated as streams finish.
+    A user's buckets are seeded lazily from the Usage table, which only knows
+    daily totals, so those are attributed to the latest hour they could have
+    happened in and age out no earlier than the real usage would.
+    """
+
+    def __init__(self, max_users: int, sync_interval: float = 0):
+        self.max_users = max_users
+        # With several workers each one only sees its own streams, so users
+        # are re-seeded from the table every sync_interval seconds
+        self.sync_interval = sync_interval
+        self.users: OrderedDict[str, dict[int, int]] = OrderedDict()
+        self.seeded: dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def seed(self, user_id: str) -> dict[int, int]:
+        now = datetime.datetime.now()
+        hour = current_hour()
+        buckets = {}
+        rows = recent_usage.execute(
+            uuid.UUID(user_id).bytes,
+            (now - datetime.timedelta(days=1)).date().isoformat(),
+        )
+        for day, tokens in rows:
+            day = Usage.day.python_value(day)
+            if day == now.date():
+                bucket = hour
+            else:
+                end_of_day = datetime.datetime.combine(day, datetime.time(23))
+                bucket = int(end_of_day.timestamp() // 3600)
+            buckets[bucket] = buckets.get(bucket, 0) + (tokens or 0)
+        # Usage this worker hasn't flushed yet isn't in the table
+        from .usage import usage_aggregator
+
+        buckets[hour] = buckets.get(hour, 0) + usage_aggregator.pending_tokens(user_id)
+        return buckets
+
+    def stale(self, user_id: str) -> bool:
+        if not self.sync_interval:
+            return False
+        return time.monotonic() - self.seeded.get(user_id, 0) > self.sync_interval
+
+    def buckets(self, user_id: str) -> dict[int, int]:
+        with self.lock:
+            buckets = self.users.get(user_id)
+            if buckets is not None and not self.stale(user_id):
+                self.users.move_to_end(user_id)
+                return buckets
+        seeded = self.seed(user_id)
+        with self.lock:
+            if buckets is None:
+                buckets = self.users.setdefault(user_id, seeded)
+            else:
+                buckets = self.users[user_id] = seeded
+            self.seeded[user_id] = time.monotonic()
+            self.users.move_to_end(user_id)
+            while len(self.users) > self.max_users:
+                evicted, _ = self.users.popitem(last=False)
+                self.seeded.pop(evicted, None)
+            return buckets
+
+    def record(self, user_id: str, tokens: int):
+        """Adds to a loaded user's current hour, never touching the database
+
+        This runs on the event loop as streams finish. Users that aren't
+        loaded pick these tokens up from the usage aggregator when they're
+        next seeded, off the loop by whoever checks their quota.
+        """
+        hour = current_hour()
+        with self.lock:
+            buckets = self.users.get(user_id)
+            if buckets is not None:
+                buckets[hour] = buckets.get(hour, 0) + tokens
+
+    def tokens(self, user_id: str) -> int:
+        buckets = self.buckets(user_id)
+        oldest = current_hour() - WINDOW_HOURS
+        with self.lock:
+            for hour in [h for h in buckets if h <= oldest]:
+                del buckets[hour]
+            return sum(buckets.values())
+
+    def exceeded(self, user_id: str) -> bool:
+        return self.tokens(user_id) > config.MAX_TOKENS
+
+
+quota = QuotaEngine(config.QUOTA_MAX_USERS, config.QUOTA_SYNC_INTERVAL)
@@ -0,0 +1,165 @@
+import asyncio
+import datetime
+import hashlib
+import json
+from typing import Iterator
+from fastapi import Request
+from peewee import Model, SqliteDatabase, CharField, BlobField, DateTimeField
+from .logs import logger
+from .util.cache import LRUCache
+from . import config
+
+CACHE_HEADER = "x-openui-cache"
+
+cache_database = SqliteDatabase(
+    config.RESPONSE_CACHE_DB,
+    pragmas=(
+        ("journal_mode", "wal"),
+        ("synchronous", "normal"),
+        ("busy_timeout", 5000),
+    ),
+)
+
+
+class CachedResponse(Model):
+    key = CharField(primary_key=True)
+    body = BlobField()
+    created_at = DateTimeField(index=True)
+
+    class Meta:
+        database = cache_database
+
+
+class ResponseCache:
+    """Exact match cache of finished SSE streams, in memory with an SQLite tier
+
+    Entries expire after `ttl` seconds, the memory tier holds the most recent
+    `memory_size` responses and the disk tier is trimmed to `disk_size` rows.
+    """
+
+    def __init__(self, ttl: float, memory_size: int, disk_size: int):
+        self.ttl = ttl
+        self.disk_size = disk_size
+        self.memory = LRUCache(memory_size, ttl=ttl)
+        self.created = False
+        # Rows in the disk tier as far as this process knows, recounted on trim
+        self.rows: int | None = None
+
+    def ensure_table(self):
+        if not self.created:
+            cache_database.create_tables([CachedResponse], safe=True)
+            self.created = True
+
+    def load(self, key: str) -> bytes | None:
+        self.ensure_table()
+        cutoff = datetime.datetime.now() - datetime.timedelta(seconds=self.ttl)
+        row = CachedResponse.get_or_none(
+            CachedResponse.key == key, CachedResponse.created_at >= cutoff
+        )
+        return None if row is None else bytes(row.body)
+
+    def save(self, key: str, body: bytes):
+        self.ensure_table()
+        now = datetime.datetime.now()
+        with cache_database.atomic():
+            CachedResponse.replace(key=key, body=body, created_at=now).execute()
+            if self.rows is None:
+                self.rows = CachedResponse.select().count()
+            else:
+                self.rows += 1
+            if self.rows > self.disk_size:
+                self.trim(now)
+
+    def trim(self, now: datetime.datetime):
+        """Drops expired rows and the oldest past disk_size, both off the index"""
+        CachedResponse.delete().where(
+            CachedResponse.created_at < now - datetime.timedelta(seconds=self.ttl)
+        ).execute()
+        newest_dropped = (
+            CachedResponse.select(CachedResponse.created_at)
+            .order_by(CachedResponse.created_at.desc())
+            .offset(self.disk_size)
+            .limit(1)
+            .scalar()
+        )
+        if newest_dropped is not None:
+            CachedResponse.delete().where(
+                CachedResponse.created_at <= newest_dropped
+            ).execute()
+        self.rows = CachedResponse.select().count()
+
+    async def get(self, key: str) -> bytes | None:
+        body = self.memory.get(key)
+        if body is None:
+            body = await asyncio.to_thread(self.load, key)
+            if body is not None:
+                self.memory.set(key, body)
+        return body
+
+    async def put(self, key: str, body: bytes):
+        self.memory.set(key, body)
+        try:
+            await asyncio.to_thread(self.save, key, body)
+        except Exception as e:
+            logger.warning("Couldn't write cached response: %s", e)
+
+
+def request_key(data: dict) -> str:
+    """Hashes the parts of a chat request that determine the response"""
+    normalized = {
+        "model": data.get("model"),
+        "messages": [
+            {"role": message.get("role"), "content": message.get("content")}
+            for message in data.get("messages", [])
+        ],
+        "temperature": data.get("temperature", 1),
+        "max_tokens": data.get("max_tokens"),
+    }
+    encoded = json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def is_cacheable(request: Request, data: dict) -> bool:
+    """Only deterministic requests are cached unless the client opts in"""
+    if not config.RESPONSE_CACHE:
+        return False
+    if request.headers.get(CACHE_HEADER, "").lower() in ("1", "true"):
+        return True
+    return data.get("temperature") == 0
+
+
+def sse_frames(body: bytes) -> Iterator[bytes]:
+    """Splits recorded SSE bytes into frames, byte for byte
+
+    Lines are split on LF with an optional CR like SSEScanner does, so CRLF
+    framed upstreams come back frame by frame too.
+    """
+    lines = body.split(b"\n")
+    tail = lines.pop()
+    frame = b""
+    for line in lines:
+        frame += line + b"\n"
+        # A blank line ends a frame, leading blank lines stay with the next one
+        if not line.rstrip(b"\r") and frame.strip():
+            yield frame
+            frame = b""
+    if frame + tail:
+        yield frame + tail
+
+
+async def replay(body: bytes):
+    """Streams a cached response with the same SSE framing it was recorded with"""
+    delay = config.RESPONSE_CACHE_REPLAY_DELAY
+    if not delay:
+        yield body
+        return
+    for frame in sse_frames(body):
+        yield frame
+        await asyncio.sleep(delay)
+
+
+response_cache = ResponseCache(
+    config.RESPONSE_CACHE_TTL,
+    config.RESPONSE_CACHE_MEMORY_SIZE,
+    config.RESPONSE_CACHE_DISK_SIZE,
+)
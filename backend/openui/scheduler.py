@@ -0,0 +1,220 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from typing import AsyncIterator
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from .logs import logger
+from . import config
+
+
+class Limiter:
+    """Caps concurrent streams for one provider or model
+
+    Requests that can't start right away wait in a bounded queue ordered by
+    start time fair queuing: each user's requests are tagged with a virtual
+    start time that grows with the cost of what they already queued, so one
+    heavy user can't starve everyone else.
+    """
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.active = 0
+        self.waiting: list[tuple[float, int, str, asyncio.Future]] = []
+        self.queued: dict[str, int] = {}
+        self.finish_tags: dict[str, float] = {}
+        self.virtual_time = 0.0
+        self.sequence = itertools.count()
+        self.hold_seconds = 10.0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_seconds = 0.0
+
+    def retry_after(self) -> int:
+        """Rough number of seconds until a new request would get a slot"""
+        depth = len(self.waiting) + 1
+        return max(1, math.ceil(self.hold_seconds * depth / self.limit))
+
+    def reject(self, status_code: int, detail: str):
+        self.rejected += 1
+        raise HTTPException(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(self.retry_after())},
+        )
+
+    async def acquire(self, user_id: str, cost: float):
+        if self.active < self.limit and not self.waiting:
+            self.active += 1
+            self.admitted += 1
+            return
+        if len(self.waiting) >= config.QUEUE_SIZE:
+            self.reject(503, f"{self.name} is at capacity, please try again shortly.")
+        if self.queued.get(user_id, 0) >= config.QUEUE_PER_USER:
+            self.reject(429, "Too many requests waiting, please try again shortly.")
+        start = max(self.virtual_time, self.finish_tags.get(user_id, 0.0))
+        self.finish_tags[user_id] = start + cost
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiting, (start, next(self.sequence), user_id, future))
+        self.queued[user_id] = self.queued.get(user_id, 0) + 1
+        began = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), config.QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            self.abandon(future, cost)
+            self.reject(503, f"Timed out waiting for {self.name}, please try again.")
+        except BaseException:
+            self.abandon(future, cost)
+            raise
+        self.wait_seconds += time.monotonic() - began
+
+    def dequeue(self, user_id: str):
+        self.queued[user_id] -= 1
+        if self.queued[user_id] == 0:
+            del self.queued[user_id]
+
+    def abandon(self, future: asyncio.Future, cost: float):
+        if future.done() and not future.cancelled():
+            # We were handed a slot just as we gave up, pass it on
+            self.release(None)
+            return
+        future.cancel()
+        for i, entry in enumerate(self.waiting):
+            if entry[3] is future:
+                self.waiting.pop(i)
+                heapq.heapify(self.waiting)
+                self.dequeue(entry[2])
+                # Give back the share of the queue this request never used
+                if entry[2] in self.finish_tags:
+                    self.finish_tags[entry[2]] -= cost
+                break
+
+    def release(self, held_seconds: float | None):
+        if held_seconds is not None:
+            self.hold_seconds = 0.8 * self.hold_seconds + 0.2 * held_seconds
+        self.active -= 1
+        while self.waiting and self.active < self.limit:
+            start, _, user_id, future = heapq.heappop(self.waiting)
+            self.dequeue(user_id)
+            self.virtual_time = start
+            self.active += 1
+            self.admitted += 1
+            future.set_result(True)
+        if not self.waiting:
+            # Idle, old tags no longer matter
+            self.finish_tags.clear()
+            self.virtual_time = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": len(self.waiting),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
+
+
+class Lease:
+    """Slots held by one request, released once its stream is done"""
+
+    def __init__(self, limiters: list[Limiter]):
+        self.limiters = limiters
+        # Set once every slot is granted, so time spent queued isn't counted
+        self.started: float | None = None
+        self.released = False
+
+    def release(self):
+        if self.released:
+            return
+        self.released = True
+        held = None if self.started is None else time.monotonic() - self.started
+        for limiter in reversed(self.limiters):
+            limiter.release(held)
+
+    async def hold(self, chunks: AsyncIterator) -> AsyncIterator:
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            self.release()
+
+
+class LeasedResponse(StreamingResponse):
+    """Releases leases once the response is done sending
+
+    Unlike a finally in the body generator, this also runs when the client
+    disconnects before the body is ever read.
+    """
+
+    def __init__(self, leases: list[Lease], content, **kwargs):
+        super().__init__(content, **kwargs)
+        self.leases = leases
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            for lease in self.leases:
+                lease.release()
+
+
+class Scheduler:
+    """Admission control for upstream providers and models
+
+    Limits come from OPENUI_CONCURRENCY, i.e. "ollama=2,ollama/llava:13b=1",
+    keys without a slash are providers, anything else is a model.
+    """
+
+    def __init__(self, limits: dict[str, int]):
+        self.limiters = {name: Limiter(name, limit) for name, limit in limits.items()}
+
+    async def acquire(
+        self, provider: str, model: str, user_id: str, cost: float = 1
+    ) -> Lease:
+        # Model slots are taken before provider slots, so a request waiting
+        # on a busy model never holds a provider slot
+        lease = Lease([])
+        try:
+            for name in (model, provider):
+                limiter = self.limiters.get(name)
+                if limiter is not None:
+                    await limiter.acquire(user_id, cost)
+                    lease.limiters.append(limiter)
+        except BaseException:
+            lease.release()
+            raise
+        lease.started = time.monotonic()
+        return lease
+
+    def stats(self) -> dict:
+        return {name: limiter.stats() for name, limiter in self.limiters.items()}
+
+
+def parse_limits(spec: str) -> dict[str, int]:
+    limits = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        try:
+            name, limit = item.rsplit("=", 1)
+            limits[name.strip()] = int(limit)
+        except ValueError:
+            logger.warning("Ignoring invalid concurrency limit: %s", item)
+    return limits
+
+
+# Every worker schedules on its own, so each gets its share of the limits
+scheduler = Scheduler(
+    {
+        name: max(1, math.ceil(limit / config.WORKERS))
+        for name, limit in parse_limits(config.CONCURRENCY).items()
+    }
+)
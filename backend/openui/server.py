@@ -3,41 +3,57 @@ from contextlib import asynccontextmanager
 from fastapi.responses import (
     StreamingResponse,
     JSONResponse,
-    HTMLResponse,
     FileResponse,
     RedirectResponse,
     Response,
 )
-from botocore.exceptions import ClientError
 from fastapi.routing import APIRouter
 from fastapi import FastAPI, Request, HTTPException, status
 from fastapi.staticfiles import StaticFiles
 from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
-from fastapi_sso.sso.github import GithubSSO
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime, timedelta
+from datetime import datetime
+import gzip
+import functools
 import html
+import hashlib
+import json
 import uuid
 import uvicorn
+from uvicorn.supervisors.multiprocess import Multiprocess
+from uvicorn._subprocess import get_subprocess
 import contextlib
 import requests
 import threading
 import time
-import getpass
+import sys
 from peewee import IntegrityError
 
-import weave
 from starlette.middleware.sessions import SessionMiddleware
 from .session import DBSessionStore, SessionData
-from .logs import logger
-from .models import count_tokens, ShareRequest, VoteRequest
-from .ollama import ollama_stream_generator, openai_to_ollama
-from .openai import openai_stream_generator
+from .logs import logger, setup_logger
+from .models import ShareRequest, VoteRequest
+from . import tokenizer
+from .tokenizer import acount_tokens
+from .ollama import ollama_stream_generator, openai_to_ollama, OllamaResidency
+from .openai import upstream_chunks, sse_stream_generator
+from .singleflight import flight_key, single_flight
+from .scheduler import Lease, LeasedResponse, scheduler
+from .hedging import hedged_open
+from . import images
+from .catalog import ModelCatalog, parse_ttls
+from .static import AssetManifest, accepted_encodings
+from .hedging import stats as hedging_stats
+from .health import HealthMonitor
+from .usage import usage_aggregator
+from .response_cache import response_cache, request_key, is_cacheable, replay
+from .quota import quota
+from .maintenance import maintenance
 from .dummy import DummyStreamGenerator
-from .db.models import User, Usage, Vote, Component
+from .db import access
+from .db.models import User, Vote, Component, database
 from .util import storage
-from .util import get_git_user_email
 from . import config
 from pydantic import ValidationError
 from multiprocessing import Queue
@@ -56,8 +72,29 @@ import os
 async def lifespan(app: FastAPI):
     logger.setLevel("DEBUG")
     logger.debug("Starting up server in %d...", os.getpid())
+    logger.info("Storing shares in %s", storage.backend.describe())
+    if config.VISION_OPTIMIZE and images.Image is None:
+        logger.warning(
+            "Screenshots are sent at full size, install OpenUI with "
+            "pip install .[vision] to resize them"
+        )
+    usage_aggregator.start()
+    health_monitor.start()
+    ollama_residency.start()
+    # Warm the model lists so the first page load doesn't wait on providers
+    model_catalog.start()
+    maintenance.start()
+    await asyncio.to_thread(static_assets.build)
+    compress = asyncio.create_task(asyncio.to_thread(static_assets.compress))
+    warming = asyncio.create_task(prewarm())
     yield
-    # any more cleanup here?
+    warming.cancel()
+    compress.cancel()
+    await maintenance.stop()
+    await model_catalog.stop()
+    await ollama_residency.stop()
+    await health_monitor.stop()
+    await usage_aggregator.stop()
 
 
 queue: Optional[Queue] = None
@@ -82,12 +119,38 @@ else:
     groq = None
 
 ollama = AsyncClient()
+ollama_residency = OllamaResidency(
+    ollama,
+    config.OLLAMA_PRELOAD,
+    config.OLLAMA_KEEP_ALIVE,
+    config.OLLAMA_RESIDENCY_INTERVAL,
+)
 ollama_openai = AsyncOpenAI(base_url=config.OLLAMA_HOST + "/v1", api_key="xxx")
+# Cheap calls that tell us whether each provider is up
+health_monitor = HealthMonitor(
+    {
+        "openai": openai.models.list,
+        "litellm": litellm.models.list,
+        "ollama": ollama.ps,
+        "ollama_openai": ollama_openai.models.list,
+        **({"groq": groq.models.list} if groq is not None else {}),
+    }
+)
 router = APIRouter()
 session_store = DBSessionStore()
-github_sso = GithubSSO(
-    config.GITHUB_CLIENT_ID, config.GITHUB_CLIENT_SECRET, f"{config.HOST}/v1/callback"
-)
+
+
+@functools.cache
+def github_sso():
+    # Only hosted deployments log in with GitHub, don't import it up front
+    from fastapi_sso.sso.github import GithubSSO
+
+    return GithubSSO(
+        config.GITHUB_CLIENT_ID,
+        config.GITHUB_CLIENT_SECRET,
+        f"{config.HOST}/v1/callback",
+    )
+
 
 app.add_middleware(
     SessionMiddleware,
@@ -104,6 +167,85 @@ app.add_middleware(
 )
 
 
+def openai_client(data: dict) -> tuple[AsyncOpenAI, int]:
+    """Picks the OpenAI compatible client for a model and its usage multiplier
+
+    Provider prefixes are stripped from data["model"] in place.
+    """
+    model = data["model"]
+    # OpenAI Models
+    if model.startswith("gpt"):
+        if model == "gpt-4" or model == "gpt-4-32k":
+            raise HTTPException(status_code=400, detail="Model not supported")
+        # gpt-4 tokens are 20x more expensive
+        return openai, 20 if "gpt-4" in model else 1
+    # Groq Models
+    elif model.startswith("groq/"):
+        data["model"] = model.replace("groq/", "")
+        if groq is None:
+            raise HTTPException(status_code=500, detail="Groq API key is not set.")
+        return groq, 1
+    # Litellm Models
+    elif model.startswith("litellm/"):
+        data["model"] = model.replace("litellm/", "")
+        if litellm is None:
+            raise HTTPException(status_code=500, detail="LiteLLM API key is not set.")
+        return litellm, 1
+    # Ollama models that work through its OpenAI compatibility layer
+    elif model.startswith("ollama/"):
+        data["model"] = model.replace("ollama/", "")
+        data.pop("max_tokens")
+        return ollama_openai, 0
+    raise HTTPException(status_code=404, detail="Invalid model")
+
+
+def provider_for(model: str) -> str:
+    if model.startswith("gpt"):
+        return "openai"
+    return model.split("/")[0]
+
+
+async def open_openai_stream(
+    data: dict,
+    model: str,
+    user_id: str,
+    cost: float,
+    leases: list[Lease] | None = None,
+):
+    """Opens an upstream stream for model, returning its chunks and usage multiplier
+
+    The stream's lease is added to leases when the caller releases it itself,
+    otherwise it's released when the chunks are exhausted or closed.
+    """
+    data = dict(data, model=model)
+    client, multiplier = openai_client(data)
+    if client is ollama_openai:
+        # Decoding and resizing screenshots is CPU bound, keep it off the loop
+        data["messages"] = await asyncio.to_thread(openai_to_ollama, data)
+    provider = "ollama_openai" if client is ollama_openai else provider_for(model)
+    health_monitor.check(provider)
+    lease = await scheduler.acquire(provider_for(model), model, user_id, cost)
+    if leases is not None:
+        leases.append(lease)
+    start = time.monotonic()
+    try:
+        response: AsyncStream[
+            ChatCompletionChunk
+        ] = await client.chat.completions.create(
+            **data,
+        )
+    except BaseException as e:
+        lease.release()
+        if isinstance(e, Exception):
+            health_monitor.failure(provider, e)
+        raise
+    health_monitor.success(provider, time.monotonic() - start)
+    if client is ollama_openai:
+        # The compatibility layer doesn't take keep_alive, extend it separately
+        ollama_residency.touch(data["model"])
+    return lease.hold(upstream_chunks(response)), multiplier
+
+
 @router.post("/v1/chat/completions", tags=["openui/chat"])
 @router.post(
     "/chat/completions",
@@ -117,95 +259,107 @@ async def chat_completions(
     if request.session.get("user_id") is None:
         raise HTTPException(status_code=401, detail="Login required to use OpenUI")
     user_id = request.session["user_id"]
-    yesterday = datetime.now() - timedelta(days=1)
-    tokens = Usage.tokens_since(user_id, yesterday.date())
-    if config.ENV == config.Env.PROD and tokens > config.MAX_TOKENS:
+    if config.ENV == config.Env.PROD and await access.read(quota.exceeded, user_id):
         raise HTTPException(
             status_code=429,
             detail="You've exceeded our usage quota, come back tomorrow to generate more UI.",
         )
     try:
         data = await request.json()  # chat_request.model_dump(exclude_unset=True)
-        input_tokens = count_tokens(data["messages"])
+        input_tokens = await acount_tokens(data["messages"], data.get("model"))
         # TODO: we always assume 4096 max tokens (random fudge factor here)
         data["max_tokens"] = 4096 - input_tokens - 20
-        # TODO: refactor all these blocks into one once Ollama supports vision
-        # OpenAI Models
-        if data.get("model").startswith("gpt"):
-            if data["model"] == "gpt-4" or data["model"] == "gpt-4-32k":
-                raise HTTPException(status=400, data="Model not supported")
-            response: AsyncStream[
-                ChatCompletionChunk
-            ] = await openai.chat.completions.create(
-                **data,
-            )
-            # gpt-4 tokens are 20x more expensive
-            multiplier = 20 if "gpt-4" in data["model"] else 1
+        if data.get("model").startswith("dummy"):
             return StreamingResponse(
-                openai_stream_generator(response, input_tokens, user_id, multiplier),
-                media_type="text/event-stream",
-            )
-        # Groq Models
-        elif data.get("model").startswith("groq/"):
-            data["model"] = data["model"].replace("groq/", "")
-            if groq is None:
-                raise HTTPException(status=500, detail="Groq API key is not set.")
-            response: AsyncStream[
-                ChatCompletionChunk
-            ] = await groq.chat.completions.create(
-                **data,
-            )
-            return StreamingResponse(
-                openai_stream_generator(response, input_tokens, user_id, 1),
-                media_type="text/event-stream",
-            )
-        # Litellm Models
-        elif data.get("model").startswith("litellm/"):
-            data["model"] = data["model"].replace("litellm/", "")
-            if litellm is None:
-                raise HTTPException(status=500, detail="LiteLLM API key is not set.")
-            response: AsyncStream[
-                ChatCompletionChunk
-            ] = await litellm.chat.completions.create(
-                **data,
-            )
-            return StreamingResponse(
-                openai_stream_generator(response, input_tokens, user_id, 1),
-                media_type="text/event-stream",
+                DummyStreamGenerator(data), media_type="text/event-stream"
             )
-        # Ollama Time
-        elif data.get("model").startswith("ollama/"):
-            data["model"] = data["model"].replace("ollama/", "")
+        cache_key = request_key(data) if is_cacheable(request, data) else None
+        if cache_key is not None:
+            cached = await response_cache.get(cache_key)
+            if cached is not None:
+                return StreamingResponse(
+                    replay(cached),
+                    media_type="text/event-stream",
+                    headers={"X-OpenUI-Cache": "hit"},
+                )
+        model = data["model"]
+        # Bigger prompts cost more of a user's fair share of a busy provider
+        cost = max(1, input_tokens / 1000)
+        # TODO: refactor this block away once Ollama supports vision
+        ollama_vision_models = ["ollama/llava", "ollama/moondream"]
+        if any([model.startswith(m) for m in ollama_vision_models]):
+            data["model"] = model.replace("ollama/", "")
             data.pop("max_tokens")
-            data["messages"] = openai_to_ollama(data)
-            ollama_vision_models = ["llava", "moondream"]
-            if any([data["model"].startswith(m) for m in ollama_vision_models]):
-                # The Ollama OpenAPI compatibility layer doesn't support images
-                # see: https://github.com/ollama/ollama/issues/3690
-                # TODO: remove this when it does or make it configurable
-                data["options"] = {
-                    "temperature": data.pop("temperature", 0.7),
-                }
+            # Decoding and resizing screenshots is CPU bound, keep it off the loop
+            data["messages"] = await asyncio.to_thread(openai_to_ollama, data)
+            # The Ollama OpenAPI compatibility layer doesn't support images
+            # see: https://github.com/ollama/ollama/issues/3690
+            # TODO: remove this when it does or make it configurable
+            data["options"] = {
+                "temperature": data.pop("temperature", 0.7),
+            }
+            data["keep_alive"] = config.OLLAMA_KEEP_ALIVE
+            health_monitor.check("ollama")
+            lease = await scheduler.acquire("ollama", model, user_id, cost)
+            start = time.monotonic()
+            try:
                 response = await ollama.chat(
                     **data,
                 )
                 gen = await ollama_stream_generator(response, data)
-            else:
-                response: AsyncStream[
-                    ChatCompletionChunk
-                ] = await ollama_openai.chat.completions.create(
-                    **data,
-                )
-
-                def gen():
-                    return openai_stream_generator(response, input_tokens, user_id, 0)
+            except BaseException as e:
+                lease.release()
+                if isinstance(e, Exception):
+                    health_monitor.failure("ollama", e)
+                raise
+            health_monitor.success("ollama", time.monotonic() - start)
+            return LeasedResponse([lease], gen(), media_type="text/event-stream")
+
+        if (
+            config.VISION_OPTIMIZE
+            and images.Image is not None
+            and not model.startswith("ollama/")
+            and images.has_images(data["messages"])
+        ):
+            # Shrink screenshots to what the model will look at, off the loop
+            await asyncio.to_thread(images.optimize_images, data["messages"], model)
+
+        # A shared stream is always read to the end by its flight, otherwise
+        # the response releases the slot even if its body is never read
+        leases: list[Lease] | None = None if config.SINGLE_FLIGHT else []
+
+        def open_upstream():
+            # Falls back to equivalent models when this one is slow or failing
+            return hedged_open(
+                model,
+                lambda member: open_openai_stream(data, member, user_id, cost, leases),
+            )
 
-            return StreamingResponse(gen(), media_type="text/event-stream")
-        elif data.get("model").startswith("dummy"):
-            return StreamingResponse(
-                DummyStreamGenerator(data), media_type="text/event-stream"
+        if config.SINGLE_FLIGHT:
+            # Identical concurrent requests share one upstream stream, the
+            # request that opened it is the only one that caches the result.
+            # Admission is per user, so a leader being turned away doesn't
+            # turn away its followers.
+            flight, leader, multiplier = await single_flight.open(
+                flight_key(data), open_upstream, retry_on=HTTPException
             )
-        raise HTTPException(status=404, detail="Invalid model")
+            chunks = flight.subscribe()
+            if not leader:
+                cache_key = None
+        else:
+            try:
+                chunks, multiplier = await open_upstream()
+            except BaseException:
+                for lease in leases:
+                    lease.release()
+                raise
+        return LeasedResponse(
+            leases or [],
+            sse_stream_generator(
+                chunks, input_tokens, user_id, multiplier, cache_key
+            ),
+            media_type="text/event-stream",
+        )
     except (ResponseError, APIStatusError) as e:
         traceback.print_exc()
         logger.exception("Known Error: %s", str(e))
@@ -237,26 +391,15 @@ async def validation_exception_handler(
     )
 
 
-@app.exception_handler(ClientError)
-async def boto3_error_handler(request: Request, exc: ClientError):
-    logger.exception("Boto3 Error: %s", exc)
-    error_code = exc.response["Error"]["Code"]
-    error_message = exc.response["Error"]["Message"]
-
-    status_code_map = {
-        "NoSuchKey": 404,
-        "NoSuchBucket": 404,
-        "AccessDenied": 403,
-        # TODO: maybe add more...
-    }
-    status_code = status_code_map.get(error_code, 500)
-
+@app.exception_handler(storage.StorageError)
+async def storage_error_handler(request: Request, exc: storage.StorageError):
+    logger.exception("Storage Error: %s", exc)
     return JSONResponse(
-        status_code=status_code,
+        status_code=exc.status_code,
         content={
             "error": {
-                "code": error_code,
-                "message": error_message,
+                "code": exc.code,
+                "message": exc.message,
             }
         },
     )
@@ -286,6 +429,7 @@ async def http_exception_hander(request: Request, exc: HTTPException):
         content=jsonable_encoder(
             {"error": {"code": "api_error", "message": exc.detail}}
         ),
+        headers=exc.headers,
     )
 
 
@@ -302,8 +446,9 @@ class SessionUpdate(Message):
 async def login(
     request: Request,
 ):
-    with github_sso:
-        return await github_sso.get_login_redirect(
+    sso = github_sso()
+    with sso:
+        return await sso.get_login_redirect(
             redirect_uri=f"{config.HOST}/v1/callback"
         )
 
@@ -328,25 +473,14 @@ async def callback(request: Request, error: str = "", error_description: str = "
             elif error == "access_denied":
                 message = "You've denied us access to verify your email with GitHub."
             raise ValueError(message)
-        with github_sso:
-            id_token = await github_sso.verify_and_process(request)
-        # TODO: should probably key off email / update info
-        user = User.get_or_none(User.username == id_token.display_name)
-        if user is None:
-            user_id = uuid.uuid4()
-            user = User.create(
-                id=user_id.bytes,
-                username=id_token.display_name,
-                email=id_token.email,
-                created_at=datetime.now(),
-            )
-            user.id = user_id
-        elif not user.email:
-            user.email = id_token.email
-            user.save()
+        sso = github_sso()
+        with sso:
+            id_token = await sso.verify_and_process(request)
+        user = await access.write(github_user, id_token)
         request.session["session_id"] = session_store.generate_session_id()
         request.session["user_id"] = str(user.id)
-        session_store.write(
+        await access.write(
+            session_store.write,
             request.session["session_id"],
             str(user.id),
             SessionData(username=user.username, token_count=0),
@@ -358,39 +492,88 @@ async def callback(request: Request, error: str = "", error_description: str = "
         return response
 
 
+def github_user(id_token) -> User:
+    # TODO: should probably key off email / update info
+    user = User.get_or_none(User.username == id_token.display_name)
+    if user is None:
+        user_id = uuid.uuid4()
+        user = User.create(
+            id=user_id.bytes,
+            username=id_token.display_name,
+            email=id_token.email,
+            created_at=datetime.now(),
+        )
+        user.id = user_id
+    elif not user.email:
+        user.email = id_token.email
+        user.save()
+    return user
+
+
 @router.post(
     "/v1/share/{id:str}",
     status_code=status.HTTP_201_CREATED,
     tags="openui/create_share",
 )
 async def create_share(id: str, payload: ShareRequest):
-    storage.upload(f"{id}.json", payload.model_dump_json())
+    await storage.aupload(f"{id}.json", payload.model_dump_json())
     return payload
 
 
 @router.get("/v1/share/{id:str}", tags="openui/get_share")
-async def get_share(id: str):
-    return Response(storage.download(f"{id}.json"), media_type="application/json")
+async def get_share(id: str, request: Request):
+    name = f"{id}.json"
+    # Shares are stored gzipped, most clients can take them as is
+    encoded = "gzip" in accepted_encodings(request.headers.get("accept-encoding", ""))
+    located = await storage.alocate(name) if encoded else None
+    try:
+        if located is not None:
+            sha, path = located
+        else:
+            sha, body = await storage.adownload_gzip(name)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Share not found")
+    headers = {
+        "ETag": f'"{sha}-gzip"' if encoded else f'"{sha}"',
+        # Shares never change once created
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Vary": "Accept-Encoding",
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if headers["ETag"] in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    if encoded:
+        headers["Content-Encoding"] = "gzip"
+        if located is not None:
+            return FileResponse(path, media_type="application/json", headers=headers)
+    else:
+        body = gzip.decompress(body)
+    return Response(body, media_type="application/json", headers=headers)
 
 
 @router.post("/v1/vote", status_code=status.HTTP_201_CREATED, tags="openui/vote")
 async def vote(request: Request, payload: VoteRequest):
-    component = Component.create(
-        id=uuid.uuid4().bytes,
-        user_id=uuid.UUID(request.session["user_id"]).bytes,
-        name=payload.name,
-        data=payload.model_dump(),
-    )
-    Vote.create(
-        id=uuid.uuid4().bytes,
-        user_id=uuid.UUID(request.session["user_id"]).bytes,
-        component_id=component.id,
-        vote=payload.vote,
-        created_at=datetime.now(),
-    )
+    await access.write(record_vote, request.session["user_id"], payload)
     return payload
 
 
+def record_vote(user_id: str, payload: VoteRequest):
+    with database.atomic():
+        component = Component.create(
+            id=uuid.uuid4().bytes,
+            user_id=uuid.UUID(user_id).bytes,
+            name=payload.name,
+            data=payload.model_dump(),
+        )
+        Vote.create(
+            id=uuid.uuid4().bytes,
+            user_id=uuid.UUID(user_id).bytes,
+            component_id=component.id,
+            vote=payload.vote,
+            created_at=datetime.now(),
+        )
+
+
 async def get_openai_models():
     try:
         await openai.models.list()
@@ -398,56 +581,127 @@ async def get_openai_models():
         return ["gpt-3.5-turbo", "gpt-4o-mini", "gpt-4o", "gpt-4-turbo"]
     except Exception:
         logger.warning("Couldn't connect to OpenAI at %s", config.OPENAI_BASE_URL)
-        return []
+        return None
 
 
 async def get_ollama_models():
     try:
-        return (await ollama.list())["models"]
+        return [m.model_dump(mode="json") for m in (await ollama.list())["models"]]
     except Exception:
         logger.warning("Couldn't connect to Ollama at %s", config.OLLAMA_HOST)
-        return []
+        return None
 
 
 async def get_groq_models():
+    if groq is None:
+        return []
     try:
         return [
-            d for d in (await groq.models.list()).data if not d.id.startswith("whisper")
+            d.model_dump(mode="json")
+            for d in (await groq.models.list()).data
+            if not d.id.startswith("whisper")
         ]
     except Exception:
         logger.warning("Couldn't connect to Groq at %s", config.GROQ_BASE_URL)
-        return []
+        return None
 
 
 async def get_litellm_models():
     try:
-        return (await litellm.models.list()).data
+        return [d.model_dump(mode="json") for d in (await litellm.models.list()).data]
     except Exception:
         logger.warning("Couldn't connect to LiteLLM at %s", config.LITELLM_BASE_URL)
-        return []
+        return None
+
+
+model_catalog = ModelCatalog(
+    {
+        "openai": get_openai_models,
+        "groq": get_groq_models,
+        "ollama": get_ollama_models,
+        "litellm": get_litellm_models,
+    },
+    parse_ttls(
+        config.MODELS_TTL, {"openai": 3600, "groq": 600, "ollama": 30, "litellm": 300}
+    ),
+)
 
 
 @router.get("/v1/models", tags="openui/models")
-async def models():
-    tasks = [
-        get_openai_models(),
-        get_groq_models(),
-        get_ollama_models(),
-        get_litellm_models(),
+async def models(request: Request):
+    catalog = await model_catalog.all()
+    ollama_models = [
+        dict(m, resident=ollama_residency.is_resident(m["model"]))
+        for m in catalog["ollama"]
     ]
-    openai_models, groq_models, ollama_models, litellm_models = await asyncio.gather(
-        *tasks
-    )
+    # Warm models first so the UI prefers them
+    catalog["ollama"] = sorted(ollama_models, key=lambda m: not m["resident"])
+    body = json.dumps({"models": catalog}).encode("utf-8")
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@router.get("/v1/metrics", tags=["openui/metrics"])
+async def metrics():
     return {
-        "models": {
-            "openai": openai_models,
-            "groq": groq_models,
-            "ollama": ollama_models,
-            "litellm": litellm_models,
-        }
+        "scheduler": scheduler.stats(),
+        "single_flight": len(single_flight),
+        "hedging": hedging_stats,
+        "providers": health_monitor.stats(),
+        "maintenance": maintenance.stats(),
     }
 
 
+@router.get("/v1/health", tags=["openui/metrics"])
+async def health():
+    """Readiness check, unhealthy providers only degrade the service"""
+    try:
+        await access.read(database.execute_sql, "SELECT 1")
+        db_ok = True
+    except Exception as e:
+        logger.warning("Database health check failed: %s", e)
+        db_ok = False
+    providers = health_monitor.stats()
+    if not db_ok:
+        status = "down"
+    elif any(p["state"] != "closed" for p in providers.values()):
+        status = "degraded"
+    else:
+        status = "ok"
+    return JSONResponse(
+        {
+            "status": status,
+            "database": db_ok,
+            "providers": providers,
+        },
+        status_code=200 if db_ok else 503,
+    )
+
+
+def local_user() -> tuple[uuid.UUID, User]:
+    user_id = uuid.uuid4()
+    try:
+        user = User.get_or_none(User.username == session_store.local_username)
+        if user is None:
+            user = User.create(
+                username=session_store.local_username,
+                created_at=datetime.now(),
+                id=user_id.bytes,
+            )
+        else:
+            user_id = user.id
+    except IntegrityError:
+        user = User.get(User.username == session_store.local_username)
+        user_id = user.id
+    if user.email is None:
+        user.email = session_store.local_email
+        user.save()
+    return user_id, user
+
+
 @router.get(
     "/v1/session",
     tags=["openui/session"],
@@ -461,25 +715,10 @@ async def get_session(
             # Give local users a session automatically
             session_id = session_store.generate_session_id()
             request.session["session_id"] = session_id
-            user_id = uuid.uuid4()
-            try:
-                user = User.get_or_none(User.username == getpass.getuser())
-                if user is None:
-                    user = User.create(
-                        username=getpass.getuser(),
-                        created_at=datetime.now(),
-                        id=user_id.bytes,
-                    )
-                else:
-                    user_id = user.id
-            except IntegrityError:
-                user = User.get(User.username == getpass.getuser())
-                user_id = user.id
-            if user.email is None:
-                user.email = get_git_user_email()
-                user.save()
+            user_id, user = await access.write(local_user)
             request.session["user_id"] = str(user_id)
-            session_store.write(
+            await access.write(
+                session_store.write,
                 request.session["session_id"],
                 str(user_id),
                 SessionData(
@@ -491,7 +730,7 @@ async def get_session(
             )
         else:
             raise HTTPException(status_code=404, detail="No session found")
-    session_data = session_store.get(session_id)
+    session_data = await access.read(session_store.get, session_id)
     return JSONResponse(
         content=session_data.model_dump(),
         status_code=200,
@@ -548,18 +787,6 @@ async def render_audio(name):
 
 
 app.include_router(router)
-app.mount(
-    "/assets",
-    StaticFiles(directory=Path(__file__).parent / "dist" / "assets", html=True),
-    name="spa",
-)
-app.mount(
-    "/monacoeditorwork",
-    StaticFiles(
-        directory=Path(__file__).parent / "dist" / "monacoeditorwork", html=False
-    ),
-    name="spa",
-)
 
 # we can serve our annotation iframe from the same domain in development
 if config.ENV != config.Env.PROD:
@@ -570,16 +797,22 @@ if config.ENV != config.Env.PROD:
     )
 
 
+static_assets = AssetManifest(Path(__file__).parent / "dist")
+
+
 @app.get("/{full_path:path}", include_in_schema=False)
-def spa(full_path: str):
-    dist_dir = Path(__file__).parent / "dist"
-    # TODO: hacky way to only serve index.html on root urls
-    files = [entry.name for entry in dist_dir.iterdir() if entry.is_file()]
-    if full_path in files:
-        return FileResponse(dist_dir / full_path)
-    if "." in full_path:
-        raise HTTPException(status_code=404, detail=f"Asset not found: {full_path}")
-    return HTMLResponse((dist_dir / "index.html").read_bytes())
+def spa(full_path: str, request: Request):
+    asset = static_assets.get(full_path)
+    if asset is None:
+        if "." in full_path:
+            raise HTTPException(
+                status_code=404, detail=f"Asset not found: {full_path}"
+            )
+        # Everything else is a client side route
+        asset = static_assets.get("index.html")
+        if asset is None:
+            raise HTTPException(status_code=404, detail="Frontend not built")
+    return static_assets.response(asset, request)
 
 
 base_url = "https://api.wandb.ai"
@@ -600,9 +833,36 @@ def check_wandb_auth():
     return key is not None
 
 
-wandb_enabled = check_wandb_auth()
-if wandb_enabled:
-    logger.info(f"WANDB_API_KEY found, enabling wandb for {base_url}")
+def init_weave():
+    if check_wandb_auth():
+        logger.info(f"WANDB_API_KEY found, enabling wandb for {base_url}")
+        import weave
+
+        weave.init(os.getenv("WANDB_PROJECT", "openui-dev"))
+
+
+async def warm(name: str, fn, *args):
+    start = time.monotonic()
+    try:
+        await asyncio.to_thread(fn, *args)
+    except Exception as e:
+        logger.warning("Couldn't prewarm %s: %s", name, e)
+        return
+    logger.debug("Prewarmed %s in %.0fms", name, (time.monotonic() - start) * 1000)
+
+
+async def prewarm():
+    """Loads what the first requests would otherwise wait on, once we're serving
+
+    Provider HTTP pools are warmed by the health probes and model catalog.
+    """
+    await asyncio.gather(
+        warm("database", access.prewarm),
+        warm("tokenizer", tokenizer.prewarm),
+        warm("storage", storage.prewarm),
+        warm("weave", init_weave),
+    )
+
 
 class Server(uvicorn.Server):
     # TODO: this still isn't working for some reason, can't ctrl-c when not in dev mode
@@ -616,14 +876,18 @@ class Server(uvicorn.Server):
         signal.signal(signal.SIGINT, shutdown_signal_handler)
         signal.signal(signal.SIGTERM, shutdown_signal_handler)
 
-    def run_with_wandb(self):
-        if wandb_enabled:
-            weave.init(os.getenv("WANDB_PROJECT", "openui-dev"))
-        self.run()
+    def run_worker(self, sockets=None):
+        # Workers are spawned fresh, so they need their own log handlers
+        setup_logger()
+        self.run(sockets=sockets)
+
+    def run_workers(self):
+        sock = self.config.bind_socket()
+        Supervisor(self.config, target=self.run_worker, sockets=[sock]).run()
 
     @contextlib.contextmanager
     def run_in_thread(self):
-        thread = threading.Thread(target=self.run_with_wandb)
+        thread = threading.Thread(target=self.run)
         thread.start()
         try:
             while not self.started:
@@ -632,3 +896,87 @@ class Server(uvicorn.Server):
         finally:
             self.should_exit = True
             thread.join()
+
+
+class Supervisor(Multiprocess):
+    """Runs config.workers server processes on a shared socket
+
+    Workers that die are replaced, with a growing delay when they die while
+    still starting up, and the supervisor gives up once a worker has failed
+    to start MAX_BOOT_FAILURES times in a row. On SIGINT / SIGTERM every
+    worker gets a SIGTERM, which Server.install_signal_handlers turns into a
+    graceful shutdown, and is killed if it hasn't exited after the graceful
+    timeout.
+    """
+
+    # Workers that exit sooner than this after starting failed to boot
+    BOOT_SECONDS = 10
+    MAX_BOOT_FAILURES = 5
+    MAX_RESTART_DELAY = 30
+
+    def startup(self):
+        super().startup()
+        now = time.monotonic()
+        self.started = [now] * len(self.processes)
+        self.failures = [0] * len(self.processes)
+        self.restarts: dict[int, float] = {}
+
+    def start(self, i: int, now: float):
+        process = get_subprocess(self.config, self.target, self.sockets)
+        process.start()
+        self.processes[i] = process
+        self.started[i] = now
+
+    def check(self, now: float) -> bool:
+        """Restarts dead workers, returns False if one keeps failing to boot"""
+        for i, process in enumerate(self.processes):
+            if i in self.restarts:
+                if now >= self.restarts[i]:
+                    del self.restarts[i]
+                    self.start(i, now)
+                continue
+            if process.is_alive():
+                continue
+            if now - self.started[i] < self.BOOT_SECONDS:
+                self.failures[i] += 1
+            else:
+                self.failures[i] = 0
+            if self.failures[i] >= self.MAX_BOOT_FAILURES:
+                logger.error(
+                    "Worker failed to start %d times in a row, giving up",
+                    self.failures[i],
+                )
+                return False
+            delay = (
+                min(self.MAX_RESTART_DELAY, 2 ** (self.failures[i] - 1))
+                if self.failures[i]
+                else 0
+            )
+            logger.warning(
+                "Worker %s exited with %s, restarting in %ds",
+                process.pid,
+                process.exitcode,
+                delay,
+            )
+            self.restarts[i] = now + delay
+        return True
+
+    def run(self):
+        self.startup()
+        healthy = True
+        while healthy and not self.should_exit.wait(0.5):
+            healthy = self.check(time.monotonic())
+        self.shutdown()
+        if not healthy:
+            sys.exit(1)
+
+    def shutdown(self):
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes:
+            process.join(self.config.timeout_graceful_shutdown or 30)
+            if process.is_alive():
+                logger.warning("Worker %s didn't exit, killing it", process.pid)
+                process.kill()
+                process.join()
@@ -1,10 +1,14 @@
+import getpass
 import uuid
 import datetime
 from pydantic import BaseModel
 from typing import Optional
-from .db.models import Session, ensure_migrated, Usage
+from .db.migrations import ensure_migrated
+from .db.models import database, Session, User
+from .quota import quota
 from . import config
 from .util import get_git_user_email
+from .util.cache import LRUCache
 
 
 class SessionData(BaseModel):
@@ -15,26 +19,44 @@ class SessionData(BaseModel):
     model: Optional[str] = ""
 
 
-now = datetime.datetime.now()
-cutoff = now - datetime.timedelta(days=7)
+def purge_expired_sessions(batch_size: int) -> int:
+    """Deletes up to batch_size expired sessions, returning how many were"""
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=config.SESSION_MAX_AGE)
+    expired = (
+        Session.select(Session.id)
+        .where(Session.created_at < cutoff)
+        .limit(batch_size)
+    )
+    return Session.delete().where(Session.id.in_(expired)).execute()
 
 
 class DBSessionStore:
     def __init__(self):
         # TODO: This is not the ideal place to be migrating
-        ensure_migrated()
-        self.cleanup()
-
-    def cleanup(self):
-        Session.delete().where(Session.created_at < cutoff).execute()
+        with database.connection_context():
+            # Queries run on the access threads, don't keep this one's open
+            ensure_migrated()
+        # The UI asks for its session on every load, token counts can lag a little
+        self.cache = LRUCache(config.SESSION_CACHE_SIZE, ttl=config.SESSION_CACHE_TTL)
+        # Who a local user is doesn't change while we're running
+        self.local_username = getpass.getuser()
+        self.local_email = get_git_user_email()
 
     @classmethod
     def record(cls, session_id: str) -> Optional[Session]:
         return Session.get_or_none(Session.id == uuid.UUID(session_id).bytes)
 
     def get(self, session_id: str) -> Optional[SessionData]:
+        data = self.cache.get(session_id)
+        if data is not None:
+            return data
         if session_id:
-            session = Session.get_or_none(Session.id == uuid.UUID(session_id).bytes)
+            session = (
+                Session.select(Session.id, User.id, User.username, User.email)
+                .join(User)
+                .where(Session.id == uuid.UUID(session_id).bytes)
+                .get_or_none()
+            )
         else:
             session = None
         if session is None:
@@ -42,19 +64,20 @@ class DBSessionStore:
                 token_count=0,
                 username="",
                 max_tokens=config.MAX_TOKENS,
-                email=get_git_user_email(),
-            )
-        else:
-            day_ago = datetime.datetime.now() - datetime.timedelta(days=1)
-            token_count = Usage.tokens_since(str(session.user_id), day_ago.date())
-            return SessionData(
-                username=session.user.username,
-                email=session.user.email,
-                token_count=token_count,
-                max_tokens=config.MAX_TOKENS,
+                email=self.local_email,
             )
+        token_count = quota.tokens(str(session.user_id))
+        data = SessionData(
+            username=session.user.username,
+            email=session.user.email,
+            token_count=token_count,
+            max_tokens=config.MAX_TOKENS,
+        )
+        self.cache.set(session_id, data)
+        return data
 
     def write(self, session_id: str, user_id: str, data: SessionData):
+        self.cache.pop(session_id)
         Session.insert(
             id=uuid.UUID(session_id).bytes,
             user_id=uuid.UUID(user_id).bytes,
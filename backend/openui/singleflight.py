@@ -0,0 +1,148 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable
+from .logs import logger
+
+Opener = Callable[[], Awaitable[tuple[AsyncIterator[bytes], Any]]]
+
+# Forwarded upstream but never change what it sends back
+VOLATILE_FIELDS = ("user",)
+
+
+def flight_key(data: dict) -> str:
+    """Hashes everything sent upstream, only identical calls share a stream"""
+    forwarded = {k: v for k, v in data.items() if k not in VOLATILE_FIELDS}
+    encoded = json.dumps(forwarded, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class Flight:
+    """A single upstream stream shared by every identical in flight request
+
+    The first request opens the upstream, later ones subscribe and get the
+    chunks already received replayed before following the live stream.
+    Whatever the opener returns alongside the chunks is the result of `opened`.
+    """
+
+    def __init__(self, key: str, flights: "SingleFlight"):
+        self.key = key
+        self.flights = flights
+        self.chunks: list[bytes] = []
+        self.finished = False
+        self.error: BaseException | None = None
+        self.opened: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+        self.task: asyncio.Task | None = None
+
+    def notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    async def pump(self, open_upstream: Opener):
+        try:
+            chunks, result = await open_upstream()
+            self.opened.set_result(result)
+            async for chunk in chunks:
+                self.chunks.append(chunk)
+                self.notify()
+        except asyncio.CancelledError:
+            # Anyone subscribing after the last subscriber left sees an error,
+            # not a stream that silently stops
+            self.error = RuntimeError("Shared upstream stream was cancelled")
+            raise
+        except Exception as e:
+            if self.opened.done():
+                logger.error("Shared upstream stream failed: %s", e)
+            else:
+                self.opened.set_exception(e)
+            self.error = e
+        finally:
+            if not self.opened.done():
+                self.opened.cancel()
+            self.finished = True
+            self.flights.discard(self)
+            self.notify()
+
+    async def wait_opened(self) -> Any:
+        """Waits for the upstream to open, counted as a subscriber meanwhile"""
+        self.subscribers += 1
+        try:
+            result = await asyncio.shield(self.opened)
+        except BaseException:
+            self.leave()
+            raise
+        # subscribe() counts the caller again once its response is read, a
+        # response that's never read then can't keep the upstream alive
+        self.subscribers -= 1
+        return result
+
+    def leave(self):
+        self.subscribers -= 1
+        # Nobody is listening anymore, stop paying for the upstream
+        if self.subscribers == 0 and not self.finished:
+            self.flights.discard(self)
+            self.task.cancel()
+
+    async def subscribe(self) -> AsyncIterator[bytes]:
+        self.subscribers += 1
+        sent = 0
+        try:
+            while True:
+                while sent < len(self.chunks):
+                    yield self.chunks[sent]
+                    sent += 1
+                if self.finished:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self.changed.wait()
+        finally:
+            self.leave()
+
+
+class SingleFlight:
+    """Coalesces concurrent requests with the same key onto one upstream stream"""
+
+    def __init__(self):
+        self.flights: dict[str, Flight] = {}
+
+    def join(self, key: str, open_upstream: Opener) -> tuple[Flight, bool]:
+        """Returns the flight for key and whether this caller started it"""
+        flight = self.flights.get(key)
+        if flight is not None:
+            return flight, False
+        flight = self.flights[key] = Flight(key, self)
+        flight.task = asyncio.create_task(flight.pump(open_upstream))
+        return flight, True
+
+    async def open(
+        self,
+        key: str,
+        open_upstream: Opener,
+        retry_on: type[BaseException] | tuple[type[BaseException], ...] = (),
+    ) -> tuple[Flight, bool, Any]:
+        """Joins the flight for key once its upstream opened, with join's leader flag
+
+        When a leader fails with one of retry_on, errors about its own request
+        like being turned away by the scheduler, followers join again and open
+        the upstream themselves instead of failing too.
+        """
+        while True:
+            flight, leader = self.join(key, open_upstream)
+            try:
+                return flight, leader, await flight.wait_opened()
+            except retry_on:
+                if leader:
+                    raise
+
+    def discard(self, flight: Flight):
+        if self.flights.get(flight.key) is flight:
+            del self.flights[flight.key]
+
+    def __len__(self) -> int:
+        return len(self.flights)
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,201 @@
+import gzip
+import hashlib
+import mimetypes
+import sys
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from fastapi import Request
+from fastapi.responses import Response
+from .logs import logger
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Vite content hashes everything it emits into assets/
+HASHED_DIRS = ("assets/",)
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+MIN_COMPRESS_SIZE = 1024
+# Precompressed variants are written next to each asset at build time with
+# python -m openui.static, anything missing is compressed at startup with
+# cheaper levels so every worker doesn't spend seconds of CPU on it
+SUFFIXES = {"gzip": ".gz", "br": ".br"}
+BUILD_LEVELS = {"gzip": 9, "br": 11}
+RUNTIME_LEVELS = {"gzip": 6, "br": 4}
+COMPRESSIBLE_TYPES = (
+    "application/javascript",
+    "application/json",
+    "image/svg+xml",
+    "font/ttf",
+    "application/x-font-ttf",
+)
+
+
+@dataclass
+class Asset:
+    body: bytes
+    media_type: str
+    etag: str
+    cache_control: str
+    encodings: dict[str, bytes] = field(default_factory=dict)
+
+    @property
+    def compressible(self) -> bool:
+        return len(self.body) >= MIN_COMPRESS_SIZE and (
+            self.media_type.startswith("text/")
+            or self.media_type in COMPRESSIBLE_TYPES
+        )
+
+
+def available_encodings() -> list[str]:
+    return ["gzip", "br"] if brotli is not None else ["gzip"]
+
+
+def compress_body(body: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=level)
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def is_variant(path: Path) -> bool:
+    """Whether path is a precompressed copy of another file"""
+    return path.suffix in SUFFIXES.values() and path.with_suffix("").is_file()
+
+
+def accepted_encodings(header: str) -> set[str]:
+    accepted = set()
+    for item in header.split(","):
+        name, _, params = item.partition(";")
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+class AssetManifest:
+    """The built frontend, read once and served from memory
+
+    Compressed variants are computed in the background after startup, until
+    they're ready assets are served uncompressed.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.assets: dict[str, Asset] = {}
+        self.built = False
+        self.lock = threading.Lock()
+
+    def build(self):
+        with self.lock:
+            if self.built:
+                return
+            assets = {}
+            if self.root.is_dir():
+                for path in sorted(self.root.rglob("*")):
+                    if not path.is_file() or is_variant(path):
+                        continue
+                    name = path.relative_to(self.root).as_posix()
+                    body = path.read_bytes()
+                    media_type = (
+                        mimetypes.guess_type(name)[0] or "application/octet-stream"
+                    )
+                    if media_type == "text/javascript":
+                        media_type = "application/javascript"
+                    asset = assets[name] = Asset(
+                        body=body,
+                        media_type=media_type,
+                        etag=hashlib.blake2b(body, digest_size=16).hexdigest(),
+                        cache_control=(
+                            IMMUTABLE if name.startswith(HASHED_DIRS) else REVALIDATE
+                        ),
+                    )
+                    for encoding, suffix in SUFFIXES.items():
+                        variant = path.with_name(path.name + suffix)
+                        if variant.is_file():
+                            asset.encodings[encoding] = variant.read_bytes()
+            else:
+                logger.warning("No frontend build found in %s", self.root)
+            self.assets = assets
+            self.built = True
+            logger.debug(
+                "Loaded %d assets (%d bytes)",
+                len(assets),
+                sum(len(a.body) for a in assets.values()),
+            )
+
+    def compress(self):
+        """Compresses the assets that weren't precompressed at build time"""
+        self.build()
+        compressed = 0
+        for asset in list(self.assets.values()):
+            if not asset.compressible:
+                continue
+            missing = [e for e in available_encodings() if e not in asset.encodings]
+            for encoding in missing:
+                body = compress_body(asset.body, encoding, RUNTIME_LEVELS[encoding])
+                if len(body) < len(asset.body):
+                    # Assigned one at a time, readers only ever see finished variants
+                    asset.encodings[encoding] = body
+            compressed += bool(missing)
+        logger.debug("Compressed %d assets", compressed)
+
+    def get(self, name: str) -> Asset | None:
+        if not self.built:
+            self.build()
+        return self.assets.get(name)
+
+    def response(self, asset: Asset, request: Request) -> Response:
+        encoding = None
+        accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+        for candidate in ("br", "gzip"):
+            if candidate in accepted and candidate in asset.encodings:
+                encoding = candidate
+                break
+        etag = f'"{asset.etag}-{encoding}"' if encoding else f'"{asset.etag}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": asset.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if_none_match = request.headers.get("if-none-match", "")
+        if etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(
+            content=asset.encodings[encoding] if encoding else asset.body,
+            media_type=asset.media_type,
+            headers=headers,
+        )
+
+
+def precompress(root: Path):
+    """Writes compressed variants next to every compressible asset under root"""
+    manifest = AssetManifest(root)
+    manifest.build()
+    written = 0
+    for name, asset in manifest.assets.items():
+        if not asset.compressible:
+            continue
+        for encoding in available_encodings():
+            body = compress_body(asset.body, encoding, BUILD_LEVELS[encoding])
+            if len(body) < len(asset.body):
+                path = root / name
+                path.with_name(path.name + SUFFIXES[encoding]).write_bytes(body)
+                written += 1
+    print(f"Wrote {written} compressed assets to {root}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    # Run at image build time, see the Dockerfile
+    precompress(
+        Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).parent / "dist"
+    )
@@ -0,0 +1,103 @@
+import asyncio
+import hashlib
+import sys
+from typing import TYPE_CHECKING
+from .util.cache import LRUCache
+from . import config
+
+if TYPE_CHECKING:
+    import tiktoken
+
+# Model families that use the newer o200k encoding, everything else
+# (including non OpenAI models) is approximated with cl100k
+O200K_MODELS = ("gpt-4o", "gpt-4.1", "gpt-4.5", "chatgpt-4o", "o1", "o3", "o4")
+ENCODINGS = ("o200k_base", "cl100k_base")
+
+encodings: dict[str, "tiktoken.Encoding"] = {}
+message_counts = LRUCache(config.TOKENIZER_CACHE_SIZE)
+
+
+def encoding_name(model: str | None) -> str:
+    if model and model.split("/")[-1].startswith(O200K_MODELS):
+        return "o200k_base"
+    return "cl100k_base"
+
+
+def get_encoding(name: str) -> "tiktoken.Encoding":
+    encoding = encodings.get(name)
+    if encoding is None:
+        import tiktoken
+
+        encoding = encodings[name] = tiktoken.get_encoding(name)
+    return encoding
+
+
+def prewarm():
+    """Loads every encoding we use, from TIKTOKEN_CACHE_DIR when it's been fetched"""
+    for name in ENCODINGS:
+        get_encoding(name)
+
+
+def message_text(message) -> str:
+    if isinstance(message["content"], str):
+        return message["content"]
+    return " ".join(
+        [part["text"] for part in message["content"] if part["type"] == "text"]
+    )
+
+
+def count_key(encoding: "tiktoken.Encoding", text: str) -> tuple[str, bytes]:
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+    return (encoding.name, digest)
+
+
+def encode_missing(encoding: "tiktoken.Encoding", missing: list[tuple]) -> int:
+    total = 0
+    for key, text in missing:
+        count = len(encoding.encode_ordinary(text))
+        message_counts.set(key, count)
+        total += count
+    return total
+
+
+def split_cached(encoding: "tiktoken.Encoding", messages) -> tuple[int, list[tuple]]:
+    """Sums the memoized messages and returns the ones that still need encoding"""
+    cached = 0
+    missing = []
+    for message in messages:
+        text = message_text(message)
+        key = count_key(encoding, text)
+        count = message_counts.get(key)
+        if count is None:
+            missing.append((key, text))
+        else:
+            cached += count
+    return cached, missing
+
+
+def count_tokens(messages, model: str | None = None) -> int:
+    """Returns the number of tokens in a list of chat messages."""
+    encoding = get_encoding(encoding_name(model))
+    cached, missing = split_cached(encoding, messages)
+    return cached + encode_missing(encoding, missing)
+
+
+async def acount_tokens(messages, model: str | None = None) -> int:
+    """Like count_tokens, but large prompts are encoded in a worker thread"""
+    name = encoding_name(model)
+    if name not in encodings:
+        await asyncio.to_thread(get_encoding, name)
+    encoding = encodings[name]
+    cached, missing = split_cached(encoding, messages)
+    if sum(len(text) for _, text in missing) > config.TOKENIZER_OFFLOAD_CHARS:
+        return cached + await asyncio.to_thread(encode_missing, encoding, missing)
+    return cached + encode_missing(encoding, missing)
+
+
+if __name__ == "__main__":
+    # python -m openui.tokenizer fills the cache for offline use, see the Dockerfile
+    prewarm()
+    print(
+        f"Cached {', '.join(ENCODINGS)} in {config.TIKTOKEN_CACHE_DIR}",
+        file=sys.stderr,
+    )
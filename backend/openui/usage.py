@@ -0,0 +1,121 @@
+import asyncio
+import datetime
+import threading
+import uuid
+from peewee import EXCLUDED
+from .db import access
+from .db.models import database, Usage
+from .logs import logger
+from .quota import quota
+from . import config
+
+
+class UsageAggregator:
+    """Collects token usage in memory and writes it to the Usage table in batches
+
+    Streams call record() when they finish, the deltas are summed per user and
+    day and flushed in one transaction every `interval` seconds, or sooner once
+    `size` distinct rows are pending.
+    """
+
+    def __init__(self, interval: float, size: int):
+        self.interval = interval
+        self.size = size
+        self.pending: dict[tuple[str, datetime.date], list[int]] = {}
+        self.lock = threading.Lock()
+        self.task: asyncio.Task | None = None
+        self.flushing: asyncio.Task | None = None
+
+    def record(self, user_id: str, input_tokens: int, output_tokens: int):
+        key = (user_id, datetime.date.today())
+        with self.lock:
+            totals = self.pending.setdefault(key, [0, 0])
+            totals[0] += input_tokens
+            totals[1] += output_tokens
+            full = len(self.pending) >= self.size
+        if full:
+            self.flush_soon()
+
+    def pending_tokens(self, user_id: str) -> int:
+        with self.lock:
+            return sum(
+                input_tokens + output_tokens
+                for (pending_user, _), (input_tokens, output_tokens) in self.pending.items()
+                if pending_user == user_id
+            )
+
+    def flush_soon(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self.flushing is None or self.flushing.done():
+            self.flushing = loop.create_task(self.aflush())
+
+    def flush(self) -> int:
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return 0
+        rows = [
+            {
+                "user_id": uuid.UUID(user_id).bytes,
+                "day": day,
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+            }
+            for (user_id, day), (input_tokens, output_tokens) in pending.items()
+        ]
+        try:
+            with database.atomic():
+                Usage.insert_many(rows).on_conflict(
+                    conflict_target=[Usage.user_id, Usage.day],
+                    update={
+                        Usage.input_tokens: Usage.input_tokens
+                        + EXCLUDED.input_tokens,
+                        Usage.output_tokens: Usage.output_tokens
+                        + EXCLUDED.output_tokens,
+                    },
+                ).execute()
+        except Exception as e:
+            logger.exception("Failed to flush usage, will retry: %s", e)
+            # Put the deltas back so the next flush picks them up
+            with self.lock:
+                for key, (input_tokens, output_tokens) in pending.items():
+                    totals = self.pending.setdefault(key, [0, 0])
+                    totals[0] += input_tokens
+                    totals[1] += output_tokens
+            return 0
+        logger.debug("Flushed usage for %d users", len(rows))
+        return len(rows)
+
+    async def aflush(self) -> int:
+        return await access.write(self.flush)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.aflush()
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        if self.flushing is not None:
+            await asyncio.gather(self.flushing, return_exceptions=True)
+        await self.aflush()
+
+
+usage_aggregator = UsageAggregator(
+    config.USAGE_FLUSH_INTERVAL, config.USAGE_FLUSH_SIZE
+)
+
+
+def record_usage(user_id: str, input_tokens: int, output_tokens: int):
+    quota.record(user_id, input_tokens + output_tokens)
+    usage_aggregator.record(user_id, input_tokens, output_tokens)
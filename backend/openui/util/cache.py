@@ -0,0 +1,69 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    """A small thread safe LRU cache with an optional time to live
+
+    With sizeof, maxsize bounds the total size of the values, i.e. bytes,
+    rather than the number of entries.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: Optional[float] = None,
+        sizeof: Optional[Callable[[Any], int]] = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.sizeof = sizeof or (lambda value: 1)
+        self.size = 0
+        self.entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _remove(self, key: Hashable):
+        _, value = self.entries.pop(key)
+        self.size -= self.sizeof(value)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires and expires < time.monotonic():
+                self._remove(key)
+                return default
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        expires = time.monotonic() + self.ttl if self.ttl else 0
+        size = self.sizeof(value)
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            if size > self.maxsize:
+                return
+            self.entries[key] = (expires, value)
+            self.size += size
+            while self.size > self.maxsize:
+                self._remove(next(iter(self.entries)))
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self._remove(key)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -13,5 +13,5 @@ def get_git_user_email():
         )
         email = result.stdout.strip()
         return email
-    except subprocess.CalledProcessError:
+    except (subprocess.CalledProcessError, FileNotFoundError):
         return None
@@ -1,23 +1,318 @@
-import boto3
+import asyncio
 import gzip
-from io import BytesIO
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+from .cache import LRUCache
+from ..logs import logger
 from .. import config
 
-s3 = boto3.client('s3', endpoint_url=config.AWS_ENDPOINT_URL_S3)
-
-def upload(name: str, data: str):
-    gzip_buffer = BytesIO()
-    with gzip.GzipFile(mode='wb', fileobj=gzip_buffer) as gzip_file:
-        gzip_file.write(data.encode('utf-8'))
-    return s3.put_object(
-        Bucket=config.BUCKET_NAME,
-        Key=name,
-        Body=gzip_buffer.getvalue(),
-        ContentEncoding='gzip',
-        ContentType='application/json'
+# Storage calls block, they run on their own threads sized to the S3 client's pool
+executor = ThreadPoolExecutor(
+    max_workers=config.STORAGE_POOL_SIZE, thread_name_prefix='storage'
+)
+
+
+def compress(data: str) -> bytes:
+    # A fixed mtime keeps the same share byte for byte identical
+    return gzip.compress(data.encode('utf-8'), mtime=0)
+
+
+def digest(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+def write_atomic(path: Path, body: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(body)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class StorageError(Exception):
+    """A failed call to the storage backend"""
+
+    def __init__(self, code: str, message: str, status_code: int = 500):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status_code = status_code
+
+
+class Backend:
+    """Where shares live, every body is stored gzipped"""
+
+    def upload(self, name: str, body: bytes):
+        raise NotImplementedError
+
+    def download(self, name: str) -> bytes:
+        raise NotImplementedError
+
+    def locate(self, name: str) -> Optional[tuple[str, Path]]:
+        """The sha256 and local path of a share, if the backend has one"""
+        return None
+
+    def describe(self) -> str:
+        raise NotImplementedError
+
+
+S3_STATUS_CODES = {
+    'NoSuchKey': 404,
+    'NoSuchBucket': 404,
+    'AccessDenied': 403,
+    # TODO: maybe add more...
+}
+
+
+class S3Backend(Backend):
+    def __init__(self, bucket: str, endpoint_url: Optional[str], pool_size: int):
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url
+        self.pool_size = pool_size
+        self.client = None
+        # The first calls arrive on several storage threads at once
+        self.client_lock = threading.Lock()
+
+    def describe(self) -> str:
+        return f'the S3 bucket {self.bucket}'
+
+    def s3(self):
+        if self.client is not None:
+            return self.client
+        with self.client_lock:
+            if self.client is None:
+                # boto3 is slow to import, only pay for it once we need it
+                import boto3
+                from botocore.config import Config
+
+                self.client = boto3.client(
+                    's3',
+                    endpoint_url=self.endpoint_url,
+                    config=Config(
+                        max_pool_connections=self.pool_size,
+                        connect_timeout=5,
+                        read_timeout=30,
+                        retries={'max_attempts': 3, 'mode': 'adaptive'},
+                        tcp_keepalive=True,
+                    ),
+                )
+        return self.client
+
+    def call(self, method: str, **kwargs):
+        from botocore.exceptions import ClientError
+
+        try:
+            return getattr(self.s3(), method)(Bucket=self.bucket, **kwargs)
+        except ClientError as e:
+            code = e.response['Error']['Code']
+            raise StorageError(
+                code,
+                e.response['Error']['Message'],
+                S3_STATUS_CODES.get(code, 500),
+            ) from e
+
+    def upload(self, name: str, body: bytes):
+        return self.call(
+            'put_object',
+            Key=name,
+            Body=body,
+            ContentEncoding='gzip',
+            ContentType='application/json'
+        )
+
+    def download(self, name: str) -> bytes:
+        return self.call('get_object', Key=name)['Body'].read()
+
+
+class BlobStore(Backend):
+    """Content addressed gzip files in sharded directories under root
+
+    Each name gets a small ref file holding the sha256 of its blob, both
+    are written to a temporary file and renamed into place.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def describe(self) -> str:
+        return str(self.root)
+
+    def ref_path(self, name: str) -> Path:
+        key = hashlib.sha256(name.encode()).hexdigest()
+        return self.root / 'refs' / key[:2] / key
+
+    def blob_path(self, sha: str) -> Path:
+        return self.root / 'blobs' / sha[:2] / sha[2:4] / f'{sha}.gz'
+
+    def blobs(self) -> list[tuple[Path, os.stat_result]]:
+        return [
+            (path, path.stat()) for path in (self.root / 'blobs').glob('*/*/*.gz')
+        ]
+
+    def put(self, name: str, body: bytes) -> tuple[str, bool]:
+        """Stores body, returning its sha256 and whether the blob is new"""
+        sha = digest(body)
+        blob = self.blob_path(sha)
+        created = not blob.exists()
+        if created:
+            write_atomic(blob, body)
+        write_atomic(self.ref_path(name), sha.encode())
+        return sha, created
+
+    def upload(self, name: str, body: bytes):
+        self.put(name, body)
+
+    def locate(self, name: str) -> Optional[tuple[str, Path]]:
+        try:
+            sha = self.ref_path(name).read_text()
+        except FileNotFoundError:
+            return None
+        blob = self.blob_path(sha)
+        return (sha, blob) if blob.exists() else None
+
+    def download(self, name: str) -> bytes:
+        located = self.locate(name)
+        if located is None:
+            raise FileNotFoundError(name)
+        return located[1].read_bytes()
+
+
+class ShareCache:
+    """Read through cache for shares, which never change once written
+
+    Gzipped bodies are kept in a memory LRU bounded by bytes and, for
+    remote backends, in a BlobStore under root. When the disk tier grows
+    past disk_bytes the least recently read blobs are removed.
+    """
+
+    def __init__(self, root: Path, memory_bytes: int, disk_bytes: int):
+        self.memory = LRUCache(memory_bytes, sizeof=lambda entry: len(entry[1]))
+        self.disk = BlobStore(root) if disk_bytes else None
+        self.disk_bytes = disk_bytes
+        self.disk_used: Optional[int] = None
+        self.lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[tuple[str, bytes]]:
+        entry = self.memory.get(name)
+        if entry is not None or self.disk is None:
+            return entry
+        located = self.disk.locate(name)
+        if located is None:
+            return None
+        sha, blob = located
+        try:
+            body = blob.read_bytes()
+            os.utime(blob)
+        except FileNotFoundError:
+            return None
+        self.memory.set(name, (sha, body))
+        return sha, body
+
+    def put(self, name: str, body: bytes) -> str:
+        sha = digest(body)
+        self.memory.set(name, (sha, body))
+        if self.disk is None:
+            return sha
+        try:
+            _, created = self.disk.put(name, body)
+            if created:
+                self.track(len(body))
+        except OSError as e:
+            logger.warning("Couldn't cache share %s on disk: %s", name, e)
+        return sha
+
+    def track(self, size: int):
+        with self.lock:
+            if self.disk_used is None:
+                self.disk_used = sum(stat.st_size for _, stat in self.disk.blobs())
+            else:
+                self.disk_used += size
+            if self.disk_used <= self.disk_bytes:
+                return
+            # Evict down to 90% so we aren't scanning on every write
+            blobs = sorted(self.disk.blobs(), key=lambda blob: blob[1].st_mtime)
+            used = sum(stat.st_size for _, stat in blobs)
+            for path, stat in blobs:
+                if used <= self.disk_bytes * 0.9:
+                    break
+                path.unlink(missing_ok=True)
+                used -= stat.st_size
+            self.disk_used = used
+            # Refs to evicted blobs are rewritten on their next miss
+            logger.debug('Evicted shares from disk cache, %d bytes used', used)
+
+
+if config.STORAGE == 's3':
+    backend: Backend = S3Backend(
+        config.BUCKET_NAME, config.AWS_ENDPOINT_URL_S3, config.STORAGE_POOL_SIZE
+    )
+elif config.STORAGE == 'filesystem':
+    backend = BlobStore(config.STORAGE_DIR)
+else:
+    raise ValueError(
+        f'OPENUI_STORAGE must be s3 or filesystem, not {config.STORAGE}'
+    )
+
+share_cache = ShareCache(
+    config.SHARE_CACHE_DIR,
+    config.SHARE_CACHE_MEMORY,
+    # Shares on the local filesystem don't need a second copy on disk
+    config.SHARE_CACHE_DISK if isinstance(backend, S3Backend) else 0,
+)
+
+
+def upload(name: str, data: str) -> str:
+    body = compress(data)
+    backend.upload(name, body)
+    return share_cache.put(name, body)
+
+
+def download_gzip(name: str) -> tuple[str, bytes]:
+    """The gzipped share and its sha256, reading through the cache"""
+    entry = share_cache.get(name)
+    if entry is None:
+        body = backend.download(name)
+        entry = share_cache.put(name, body), body
+    return entry
+
+
+def download(name: str) -> bytes:
+    return gzip.decompress(download_gzip(name)[1])
+
+
+def prewarm():
+    if isinstance(backend, S3Backend):
+        backend.s3()
+
+
+async def aupload(name: str, data: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, upload, name, data
+    )
+
+
+async def adownload_gzip(name: str) -> tuple[str, bytes]:
+    entry = share_cache.memory.get(name)
+    if entry is not None:
+        return entry
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, download_gzip, name
     )
 
-def download(name: str) -> str:
-    response = s3.get_object(Bucket=config.BUCKET_NAME, Key=name)
-    gzip_content = response['Body'].read()
-    return gzip.decompress(gzip_content)
\ No newline at end of file
+
+async def alocate(name: str) -> Optional[tuple[str, Path]]:
+    """A local file that can be sent as is, when the backend has one"""
+    if not isinstance(backend, BlobStore):
+        return None
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, backend.locate, name
+    )
@@ -0,0 +1,109 @@
+import asyncio
+import datetime
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from peewee import OperationalError, SqliteDatabase
+from playhouse.pool import PooledPostgresqlDatabase
+from openui import config
+from openui.db import access
+from openui.db.models import connect_database, Usage, User
+from openui.quota import recent_usage
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    db = connect_database(str(tmp_path / "db.sqlite"))
+    monkeypatch.setattr(access, "database", db)
+    with db.bind_ctx([User, Usage]):
+        db.create_tables([User, Usage])
+        yield db
+    db.close()
+
+
+def test_readers_reject_writes(db):
+    readers = ThreadPoolExecutor(1, initializer=access.read_only)
+
+    def count():
+        return Usage.select().count()
+
+    def insert():
+        Usage.update_tokens(str(uuid.uuid4()), 1, 1)
+
+    async def run():
+        await access.run(readers, insert)
+
+    with pytest.raises(OperationalError, match="readonly"):
+        asyncio.run(run())
+    assert readers.submit(count).result() == 0
+    readers.shutdown()
+
+
+def test_sqlite_writes_run_one_at_a_time():
+    assert isinstance(access.database, SqliteDatabase)
+    lock = threading.Lock()
+    active, peak = [0], [0]
+
+    def work():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+
+    async def run():
+        await asyncio.gather(*[access.write(work) for _ in range(5)])
+
+    asyncio.run(run())
+    assert peak[0] == 1
+
+
+def test_statement_matches_the_peewee_query(db):
+    user_id, other_id = uuid.uuid4(), uuid.uuid4()
+    for id in (user_id, other_id):
+        User.create(id=id.bytes, username=str(id), created_at=datetime.datetime.now())
+    Usage.update_tokens(str(user_id), 10, 5)
+    Usage.update_tokens(str(other_id), 1, 1)
+    since = datetime.date.today() - datetime.timedelta(days=1)
+    expected = list(
+        Usage.select(Usage.day, Usage.input_tokens + Usage.output_tokens)
+        .where(Usage.user_id == user_id, Usage.day >= since)
+        .tuples()
+    )
+    rows = recent_usage.execute(user_id.bytes, since.isoformat())
+    assert [(Usage.day.python_value(day), tokens) for day, tokens in rows] == expected
+    assert expected == [(datetime.date.today(), 15)]
+
+
+def test_pooled_connections_are_returned_after_each_call(monkeypatch):
+    pool = PooledPostgresqlDatabase("openui", max_connections=config.DB_POOL_SIZE)
+    checked_out = []
+
+    def connect(reuse_if_open=False):
+        checked_out.append(threading.get_ident())
+        pool._state.closed = False
+
+    def close():
+        checked_out.remove(threading.get_ident())
+        pool._state.closed = True
+
+    monkeypatch.setattr(pool, "connect", connect)
+    monkeypatch.setattr(pool, "close", close)
+    monkeypatch.setattr(access, "database", pool)
+
+    async def run():
+        return await asyncio.gather(
+            *[access.read(lambda: len(checked_out)) for _ in range(8)],
+            *[access.write(lambda: len(checked_out)) for _ in range(8)],
+        )
+
+    assert all(asyncio.run(run()))
+    assert checked_out == []
+
+
+def test_pool_covers_every_access_thread():
+    # Readers, Postgres writers and the connection migrating at startup
+    assert config.DB_POOL_SIZE >= 2 * config.DB_READERS + 1
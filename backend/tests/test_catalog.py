@@ -0,0 +1,51 @@
+import asyncio
+from fastapi.testclient import TestClient
+from openui import server
+from openui.catalog import ModelCatalog
+
+
+def test_models_etag_revalidates_until_the_catalog_refreshes(monkeypatch):
+    lists = [[{"id": "gpt-4o"}], [{"id": "gpt-4o"}, {"id": "gpt-4.1"}]]
+
+    async def openai_models():
+        return lists.pop(0)
+
+    async def ollama_models():
+        return []
+
+    catalog = ModelCatalog(
+        {"openai": openai_models, "ollama": ollama_models},
+        {"openai": 3600, "ollama": 3600},
+    )
+    monkeypatch.setattr(server, "model_catalog", catalog)
+    client = TestClient(server.app)
+
+    first = client.get("/v1/models")
+    etag = first.headers["ETag"]
+    assert first.json()["models"]["openai"] == [{"id": "gpt-4o"}]
+    cached = client.get("/v1/models", headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.content == b""
+
+    asyncio.run(catalog.fetch("openai"))
+    refreshed = client.get("/v1/models", headers={"If-None-Match": etag})
+    assert refreshed.status_code == 200
+    assert refreshed.headers["ETag"] != etag
+    assert len(refreshed.json()["models"]["openai"]) == 2
+
+
+def test_failed_refresh_keeps_the_last_good_list():
+    results = [["a"], RuntimeError("down")]
+
+    async def fetch():
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def run():
+        catalog = ModelCatalog({"p": fetch}, {"p": 0})
+        first = await catalog.get("p")
+        await catalog.refresh("p")
+        return first, await catalog.get("p")
+
+    assert asyncio.run(run()) == (["a"], ["a"])
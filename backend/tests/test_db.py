@@ -0,0 +1,42 @@
+import datetime
+import os
+import uuid
+from openui.db.migrations import Backfill, ensure_migrated, MIGRATIONS, MODELS
+from openui.db.models import connect_database, SchemaMigration, Session, Usage, User
+
+
+def test_models_work_on_configured_database(tmp_path):
+    # Point OPENUI_TEST_DATABASE at a throwaway postgres to test against it
+    db = connect_database(
+        os.getenv("OPENUI_TEST_DATABASE", str(tmp_path / "db.sqlite"))
+    )
+    with db.bind_ctx(MODELS):
+        db.drop_tables(MODELS)
+        ensure_migrated(db)
+        ensure_migrated(db)
+        assert SchemaMigration.select().count() == len(MIGRATIONS)
+
+        user_id = uuid.uuid4()
+        User.create(id=user_id.bytes, username="u", created_at=datetime.datetime.now())
+        Session.create(
+            id=uuid.uuid4().bytes,
+            user_id=user_id.bytes,
+            data={"model": "gpt-4o", "nested": [1, 2]},
+            created_at=datetime.datetime.now(),
+            updated_at=datetime.datetime.now(),
+        )
+        session = Session.get(Session.user == user_id.bytes)
+        assert session.data == {"model": "gpt-4o", "nested": [1, 2]}
+        assert session.user.id == user_id
+
+        Usage.update_tokens(str(user_id), 10, 5)
+        Usage.update_tokens(str(user_id), 1, 1)
+        assert Usage.tokens_since(str(user_id), datetime.date.today()) == 17
+
+        for i in range(5):
+            User.create(
+                id=uuid.uuid4().bytes, username=f"u{i}", created_at=datetime.datetime.now()
+            )
+        Backfill(User, {User.email: "unknown"}, User.email.is_null(), 2).apply(db)
+        assert User.select().where(User.email.is_null()).count() == 0
+    db.close()
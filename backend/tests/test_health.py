@@ -0,0 +1,36 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from openui import config
+from openui.health import HealthMonitor, CLOSED, OPEN
+
+
+def test_breaker_opens_and_probe_closes(monkeypatch):
+    monkeypatch.setattr(config, "BREAKER_FAILURES", 3)
+    healthy = False
+
+    async def probe():
+        if not healthy:
+            raise ConnectionError("refused")
+
+    monitor = HealthMonitor({"ollama": probe})
+    breaker = monitor.breakers["ollama"]
+    for _ in range(3):
+        monitor.failure("ollama", ConnectionError("refused"))
+    assert breaker.state == OPEN
+    with pytest.raises(HTTPException) as e:
+        monitor.check("ollama")
+    assert e.value.status_code == 503
+    assert "Retry-After" in e.value.headers
+
+    healthy = True
+    asyncio.run(monitor.probe("ollama"))
+    assert breaker.state == CLOSED
+    monitor.check("ollama")
+
+
+def test_client_errors_dont_open_breaker(monkeypatch):
+    monkeypatch.setattr(config, "BREAKER_FAILURES", 1)
+    monitor = HealthMonitor({"openai": None})
+    monitor.failure("openai", HTTPException(status_code=400))
+    assert monitor.breakers["openai"].state == CLOSED
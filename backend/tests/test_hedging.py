@@ -0,0 +1,44 @@
+import asyncio
+import httpx
+from openai import APIStatusError
+from openui import hedging
+
+
+def opener(delays, errors=()):
+    closed = []
+
+    async def stream(model):
+        try:
+            await asyncio.sleep(delays[model])
+            yield model.encode()
+        finally:
+            closed.append(model)
+
+    async def open_model(model):
+        if model in errors:
+            response = httpx.Response(
+                503, request=httpx.Request("POST", "http://upstream")
+            )
+            raise APIStatusError("unavailable", response=response, body=None)
+        return stream(model), 1
+
+    return open_model, closed
+
+
+async def read(model, open_model):
+    chunks, _ = await hedging.hedged_open(model, open_model)
+    return [chunk async for chunk in chunks]
+
+
+def test_hedges_slow_first_token(monkeypatch):
+    monkeypatch.setattr(hedging, "groups", [["slow", "fast"]])
+    monkeypatch.setattr(hedging, "budgets", {"slow": 0.01})
+    open_model, closed = opener({"slow": 1, "fast": 0})
+    assert asyncio.run(read("slow", open_model)) == [b"fast"]
+    assert "slow" in closed
+
+
+def test_fails_over_on_5xx(monkeypatch):
+    monkeypatch.setattr(hedging, "groups", [["a", "b", "c"]])
+    open_model, _ = opener({"c": 0}, errors=("a", "b"))
+    assert asyncio.run(read("a", open_model)) == [b"c"]
@@ -0,0 +1,59 @@
+import base64
+from io import BytesIO
+from PIL import Image
+from openui import images
+
+
+def data_url(size: tuple[int, int], fmt: str = "PNG") -> str:
+    out = BytesIO()
+    Image.new("RGB", size, "white").save(out, format=fmt)
+    encoded = base64.b64encode(out.getvalue()).decode()
+    return f"data:image/{fmt.lower()};base64,{encoded}"
+
+
+def image_size(url_or_bytes) -> tuple[int, int]:
+    if isinstance(url_or_bytes, str):
+        url_or_bytes = images.decode_data_url(url_or_bytes)
+    return Image.open(BytesIO(url_or_bytes)).size
+
+
+def test_ollama_image_fits_the_models_resolution():
+    url = data_url((2000, 1000))
+    resized = images.ollama_image(url, "llava:13b")
+    assert image_size(resized) == (672, 336)
+    # The cache is bounded by bytes, not images
+    assert images.ollama_images.size >= len(resized)
+    small = data_url((100, 50))
+    assert images.ollama_image(small, "llava") == images.decode_data_url(small)
+
+
+def test_optimize_images_resizes_and_leaves_other_parts_alone():
+    text = {"type": "text", "text": "make this"}
+    remote = {"type": "image_url", "image_url": {"url": "https://example.com/a.png"}}
+    screenshot = {"type": "image_url", "image_url": {"url": data_url((4000, 3000))}}
+    messages = [
+        {"role": "system", "content": "be nice"},
+        {"role": "user", "content": [text, remote, screenshot]},
+    ]
+    images.optimize_images(messages, "gpt-4o")
+    assert messages[0] == {"role": "system", "content": "be nice"}
+    assert messages[1]["content"][:2] == [
+        {"type": "text", "text": "make this"},
+        {"type": "image_url", "image_url": {"url": "https://example.com/a.png"}},
+    ]
+    optimized = screenshot["image_url"]
+    assert optimized["url"].startswith("data:image/webp;base64,")
+    assert optimized["detail"] == "high"
+    assert image_size(optimized["url"]) == (1024, 768)
+
+
+def test_falls_back_to_the_original_without_pillow(monkeypatch):
+    monkeypatch.setattr(images, "Image", None)
+    images.optimized_images.clear()
+    url = data_url((4000, 3000))
+    raw = images.decode_data_url(url)
+    assert images.downscale(raw, 672) == raw
+    part = {"type": "image_url", "image_url": {"url": url}}
+    messages = [{"role": "user", "content": [part]}]
+    images.optimize_images(messages, "gpt-4o")
+    assert part["image_url"] == {"url": url, "detail": "auto"}
@@ -0,0 +1,152 @@
+import asyncio
+import datetime
+import logging
+import uuid
+import pytest
+from peewee import PostgresqlDatabase
+from openui import config, maintenance as maintenance_module
+from openui.db import access
+from openui.db.models import connect_database, Session, User
+from openui.maintenance import (
+    Job,
+    Maintenance,
+    maintenance_jobs,
+    parse_intervals,
+    purge_sessions,
+)
+from openui.session import purge_expired_sessions
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    db = connect_database(str(tmp_path / "db.sqlite"))
+    monkeypatch.setattr(access, "database", db)
+    monkeypatch.setattr(maintenance_module, "database", db)
+    with db.bind_ctx([User, Session]):
+        db.create_tables([User, Session])
+        yield db
+    db.close()
+
+
+def add_sessions(count: int, age: datetime.timedelta):
+    user = User.create(
+        id=uuid.uuid4(), username=str(uuid.uuid4()), created_at=datetime.datetime.now()
+    )
+    created = datetime.datetime.now() - age
+    for _ in range(count):
+        Session.create(
+            id=uuid.uuid4(), user=user, data={}, created_at=created, updated_at=created
+        )
+
+
+def test_jobs_report_durations_and_failures(tmp_path):
+    async def ok():
+        await asyncio.sleep(0.01)
+
+    async def broken():
+        raise RuntimeError("disk full")
+
+    maintenance = Maintenance(
+        [Job("ok", 60, ok), Job("broken", 60, broken)], tmp_path / "lock"
+    )
+
+    async def run():
+        for job in maintenance.jobs:
+            await maintenance.run_job(job)
+
+    asyncio.run(run())
+    stats = maintenance.stats()
+    assert stats["ok"]["runs"] == 1 and stats["ok"]["last_duration_ms"] >= 10
+    assert stats["broken"]["failures"] == 1
+    assert stats["broken"]["last_error"] == "disk full"
+
+
+def test_only_one_worker_runs_maintenance(tmp_path):
+    async def noop():
+        pass
+
+    first = Maintenance([Job("noop", 60, noop)], tmp_path / "lock")
+    second = Maintenance([Job("noop", 60, noop)], tmp_path / "lock")
+
+    async def run():
+        first.start()
+        second.start()
+        started = (first.task is not None, second.task is not None)
+        await first.stop()
+        # The lock is released once the first worker stops
+        second.start()
+        started += (second.task is not None,)
+        await second.stop()
+        return started
+
+    assert asyncio.run(run()) == (True, False, True)
+
+
+def test_parse_intervals():
+    defaults = {"sessions": 3600, "vacuum": 3600}
+    assert parse_intervals("", defaults) == defaults
+    assert parse_intervals(" vacuum = 0 ,checkpoint=60,junk", defaults) == {
+        "sessions": 3600,
+        "vacuum": 0,
+        "checkpoint": 60,
+    }
+    with pytest.raises(ValueError):
+        parse_intervals("vacuum=never", defaults)
+
+
+def test_purge_expired_sessions_in_batches(db, monkeypatch):
+    add_sessions(5, datetime.timedelta(days=config.SESSION_MAX_AGE + 1))
+    add_sessions(1, datetime.timedelta(days=1))
+    assert [purge_expired_sessions(2) for _ in range(4)] == [2, 2, 1, 0]
+    assert Session.select().count() == 1
+
+    add_sessions(3, datetime.timedelta(days=config.SESSION_MAX_AGE + 1))
+    monkeypatch.setattr(config, "SESSION_PURGE_BATCH", 2)
+    batches = []
+    write = access.write
+
+    async def counting_write(fn, *args):
+        batches.append(await write(fn, *args))
+        return batches[-1]
+
+    monkeypatch.setattr(access, "write", counting_write)
+    asyncio.run(purge_sessions())
+    assert batches == [2, 1, 0]
+    assert Session.select().count() == 1
+
+
+def test_sqlite_jobs_are_skipped_on_postgres(monkeypatch):
+    monkeypatch.setattr(config, "MAINTENANCE", "")
+    jobs = [job.name for job in maintenance_jobs()]
+    assert jobs == ["sessions", "checkpoint", "optimize", "vacuum"]
+
+    monkeypatch.setattr(maintenance_module, "database", PostgresqlDatabase("openui"))
+    assert [job.name for job in maintenance_jobs()] == ["sessions"]
+
+    monkeypatch.setattr(config, "MAINTENANCE", "sessions=0")
+    assert maintenance_jobs() == []
+
+
+def test_vacuum_never_rewrites_the_database(db, monkeypatch, caplog):
+    monkeypatch.setattr(maintenance_module, "vacuum_warned", False)
+    executed = []
+    execute_sql = db.execute_sql
+
+    def recording_execute_sql(sql, *args, **kwargs):
+        executed.append(sql)
+        return execute_sql(sql, *args, **kwargs)
+
+    monkeypatch.setattr(db, "execute_sql", recording_execute_sql)
+    with caplog.at_level(logging.WARNING, logger="openui"):
+        maintenance_module.vacuum()
+        maintenance_module.vacuum()
+    assert "VACUUM" not in executed
+    assert not maintenance_module.incremental_vacuum_enabled()
+    assert sum("--vacuum" in r.getMessage() for r in caplog.records) == 1
+
+    maintenance_module.enable_incremental_vacuum()
+    assert maintenance_module.incremental_vacuum_enabled()
+    executed.clear()
+    maintenance_module.vacuum()
+    pages = maintenance_module.VACUUM_PAGES
+    assert executed[-1] == f"PRAGMA incremental_vacuum({pages})"
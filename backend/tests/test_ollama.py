@@ -0,0 +1,106 @@
+import asyncio
+import datetime
+import threading
+from types import SimpleNamespace
+from fastapi.testclient import TestClient
+from openui import server
+from openui.catalog import ModelCatalog
+from openui.ollama import OllamaResidency
+
+
+class FakeOllama:
+    def __init__(self, resident: list[str]):
+        self.resident = resident
+        self.generated = []
+
+    async def ps(self):
+        expires = datetime.datetime.now() + datetime.timedelta(minutes=5)
+        return SimpleNamespace(
+            models=[SimpleNamespace(model=m, expires_at=expires) for m in self.resident]
+        )
+
+    async def generate(self, model, prompt, keep_alive):
+        self.generated.append((model, keep_alive))
+
+
+def test_residency_tracks_ps_and_touches_once_an_interval():
+    client = FakeOllama(["llava:latest"])
+    residency = OllamaResidency(client, [], "30m", interval=60)
+
+    async def run():
+        await residency.refresh()
+        residency.touch("llama3")
+        residency.touch("llama3:latest")
+        pending = set(residency.loading)
+        await asyncio.gather(*pending)
+        return len(pending), residency.loading
+
+    started, loading = asyncio.run(run())
+    assert residency.is_resident("llava") and not residency.is_resident("moondream")
+    assert started == 1 and not loading
+    assert client.generated == [("llama3:latest", "30m")]
+    assert residency.is_resident("llama3")
+
+
+def test_refresh_survives_unexpected_ps_responses():
+    class OldOllama(FakeOllama):
+        async def ps(self):
+            # Clients before 0.4 returned plain dicts
+            return {"models": [{"model": "llava:latest"}]}
+
+    residency = OllamaResidency(OldOllama([]), [], "30m", interval=60)
+    residency.resident = {"llava:latest": 0}
+    asyncio.run(residency.refresh())
+    assert not residency.reachable and residency.resident == {}
+
+
+def test_models_lists_resident_ollama_models_first(monkeypatch):
+    async def ollama_models():
+        return [{"model": "cold:latest"}, {"model": "warm:latest"}]
+
+    async def no_models():
+        return []
+
+    catalog = ModelCatalog(
+        {"openai": no_models, "ollama": ollama_models}, {"openai": 60, "ollama": 60}
+    )
+    monkeypatch.setattr(server, "model_catalog", catalog)
+    monkeypatch.setattr(server.ollama_residency, "resident", {"warm:latest": 0})
+    response = TestClient(server.app).get("/v1/models")
+    assert response.json()["models"]["ollama"] == [
+        {"model": "warm:latest", "resident": True},
+        {"model": "cold:latest", "resident": False},
+    ]
+
+
+def test_compat_images_are_converted_off_the_event_loop(monkeypatch):
+    threads = []
+    sent = []
+
+    def openai_to_ollama(data):
+        threads.append(threading.current_thread())
+        return [{"role": "user", "content": "hi", "images": ["abc"]}]
+
+    async def create(**data):
+        sent.append(data)
+        return SimpleNamespace()
+
+    client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+    )
+    monkeypatch.setattr(server, "ollama_openai", client)
+    monkeypatch.setattr(server, "openai_to_ollama", openai_to_ollama)
+    monkeypatch.setattr(server.ollama_residency, "touch", lambda model: None)
+    data = {"messages": [], "max_tokens": 100}
+
+    async def run():
+        chunks, multiplier = await server.open_openai_stream(
+            data, "ollama/llava", "user", 1
+        )
+        await chunks.aclose()
+        return multiplier
+
+    assert asyncio.run(run()) == 0
+    assert threads and threads[0] is not threading.main_thread()
+    assert sent[0]["model"] == "llava"
+    assert sent[0]["messages"][0]["images"] == ["abc"]
@@ -0,0 +1,99 @@
+import asyncio
+import httpx
+from openai import AsyncOpenAI
+from openui import openai as openui_openai
+from openui.openai import SSEScanner, openai_stream_generator
+
+FRAMES = [
+    b'data: {"id":"1","object":"chat.completion.chunk","created":1,"model":"gpt-4o","choices":[{"index":0,"delta":{"content":"<img src=\\"data:image/png\\">"}}]}\n\n',
+    b'data: {"id":"1","object":"chat.completion.chunk","created":1,"model":"gpt-4o","choices":[{"index":0,"delta":{"content":" hi"}}]}\n\n',
+    b"data: [DONE]\n\n",
+]
+
+
+def test_scanner_handles_split_frames():
+    scanner = SSEScanner()
+    body = b"".join(FRAMES)
+    for i in range(0, len(body), 7):
+        scanner.feed(body[i : i + 7])
+    assert scanner.frames == 2
+    assert scanner.done
+
+
+def test_passthrough_forwards_raw_bytes(monkeypatch):
+    usage = []
+    monkeypatch.setattr(openui_openai.config, "SSE_PASSTHROUGH", True)
+    monkeypatch.setattr(
+        openui_openai, "record_usage", lambda *args: usage.extend(args)
+    )
+
+    def handler(request):
+        return httpx.Response(
+            200,
+            headers={"content-type": "text/event-stream"},
+            content=b"".join(FRAMES),
+        )
+
+    async def run():
+        client = AsyncOpenAI(
+            api_key="xxx",
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        )
+        stream = await client.chat.completions.create(
+            model="gpt-4o", messages=[{"role": "user", "content": "hi"}], stream=True
+        )
+        return [
+            chunk
+            async for chunk in openai_stream_generator(
+                stream, 10, "00000000-0000-0000-0000-000000000000", 2
+            )
+        ]
+
+    chunks = asyncio.run(run())
+    assert b"".join(chunks) == b"".join(FRAMES)
+    assert usage[1:] == [20, 4]
+
+
+def test_passthrough_reads_weave_wrapped_streams_through_the_wrapper(monkeypatch):
+    from weave.trace.op import _IteratorWrapper
+
+    usage = []
+    traced = []
+    closed = []
+    monkeypatch.setattr(openui_openai.config, "SSE_PASSTHROUGH", True)
+    monkeypatch.setattr(
+        openui_openai, "record_usage", lambda *args: usage.extend(args)
+    )
+
+    def handler(request):
+        return httpx.Response(
+            200,
+            headers={"content-type": "text/event-stream"},
+            content=b"".join(FRAMES),
+        )
+
+    async def run():
+        client = AsyncOpenAI(
+            api_key="xxx",
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        )
+        stream = await client.chat.completions.create(
+            model="gpt-4o", messages=[{"role": "user", "content": "hi"}], stream=True
+        )
+        # What weave returns when tracing is on, its close() is synchronous
+        wrapped = _IteratorWrapper(
+            stream, traced.append, lambda e: None, lambda: closed.append(True)
+        )
+        return [
+            chunk
+            async for chunk in openai_stream_generator(
+                wrapped, 10, "00000000-0000-0000-0000-000000000000"
+            )
+        ]
+
+    chunks = asyncio.run(run())
+    contents = [chunk.choices[0].delta.content for chunk in traced]
+    assert contents == ['<img src="data:image/png">', " hi"]
+    assert closed == [True]
+    assert chunks[-1] == FRAMES[-1]
+    assert usage[1:] == [10, 2]
@@ -0,0 +1,40 @@
+from openui import quota as quota_module
+from openui.quota import QuotaEngine
+
+
+def test_rolling_window(monkeypatch):
+    hour = [1000]
+    monkeypatch.setattr(quota_module, "current_hour", lambda: hour[0])
+    engine = QuotaEngine(max_users=2)
+    monkeypatch.setattr(engine, "seed", lambda user_id: {hour[0] - 30: 5, 990: 7})
+    assert engine.tokens("a") == 7
+    engine.record("a", 10)
+    assert engine.tokens("a") == 17
+    hour[0] += 14
+    engine.record("a", 1)
+    assert engine.tokens("a") == 11
+    hour[0] += 10
+    assert engine.tokens("a") == 1
+
+
+def test_evicts_least_recent_user(monkeypatch):
+    engine = QuotaEngine(max_users=2)
+    monkeypatch.setattr(engine, "seed", lambda user_id: {})
+    for user_id in ["a", "b", "a", "c"]:
+        engine.tokens(user_id)
+    assert list(engine.users) == ["a", "c"]
+
+
+def test_record_never_seeds(monkeypatch):
+    engine = QuotaEngine(max_users=2, sync_interval=30)
+
+    def seed(user_id):
+        raise AssertionError("record shouldn't read the database")
+
+    monkeypatch.setattr(engine, "seed", seed)
+    engine.record("a", 10)
+    assert "a" not in engine.users
+    # Stale users are bumped in memory and re-seeded on their next check
+    engine.users["b"], engine.seeded["b"] = {}, 0
+    engine.record("b", 10)
+    assert sum(engine.users["b"].values()) == 10
@@ -0,0 +1,78 @@
+import asyncio
+import pytest
+from fastapi import Request
+from openui import config
+from openui.response_cache import (
+    CachedResponse,
+    ResponseCache,
+    cache_database,
+    is_cacheable,
+    replay,
+    request_key,
+)
+
+
+@pytest.fixture
+def cache_db(tmp_path):
+    cache_database.init(str(tmp_path / "cache.sqlite"))
+    yield cache_database
+    cache_database.close()
+    cache_database.init(str(config.RESPONSE_CACHE_DB))
+
+
+def make_request(headers: dict) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "headers": [(k.encode(), v.encode()) for k, v in headers.items()],
+        }
+    )
+
+
+def test_request_key_ignores_fields_that_dont_change_the_response():
+    data = {
+        "model": "gpt-4o",
+        "messages": [{"role": "user", "content": "hi", "name": "ignored"}],
+        "temperature": 0,
+    }
+    same = {**data, "stream": True, "messages": [{"content": "hi", "role": "user"}]}
+    assert request_key(data) == request_key(same)
+    assert request_key(data) != request_key({**data, "temperature": 0.5})
+    assert request_key(data) != request_key({**data, "model": "gpt-4o-mini"})
+
+
+def test_is_cacheable(monkeypatch):
+    monkeypatch.setattr(config, "RESPONSE_CACHE", True)
+    assert is_cacheable(make_request({}), {"temperature": 0})
+    assert not is_cacheable(make_request({}), {"temperature": 0.7})
+    assert is_cacheable(make_request({"x-openui-cache": "true"}), {})
+    monkeypatch.setattr(config, "RESPONSE_CACHE", False)
+    assert not is_cacheable(make_request({"x-openui-cache": "true"}), {})
+
+
+@pytest.mark.parametrize("newline", [b"\n", b"\r\n"])
+def test_replay_keeps_frames(monkeypatch, newline):
+    monkeypatch.setattr(config, "RESPONSE_CACHE_REPLAY_DELAY", 0.001)
+    frames = [
+        b"data: {}" + newline + newline,
+        b": comment" + newline + b"data: {}" + newline + newline,
+        b"data: [DONE]" + newline + newline,
+    ]
+
+    async def run():
+        return [frame async for frame in replay(b"".join(frames))]
+
+    assert asyncio.run(run()) == frames
+
+
+def test_disk_tier_survives_memory_and_is_trimmed(cache_db):
+    cache = ResponseCache(ttl=60, memory_size=1, disk_size=3)
+
+    async def run():
+        for i in range(5):
+            await cache.put(f"k{i}", f"body{i}".encode())
+        cache.memory.clear()
+        return [await cache.get(f"k{i}") for i in range(5)]
+
+    assert asyncio.run(run()) == [None, None, b"body2", b"body3", b"body4"]
+    assert CachedResponse.select().count() == 3
@@ -0,0 +1,99 @@
+import asyncio
+import time
+import pytest
+from fastapi import HTTPException
+from openui import scheduler as scheduler_module
+from openui.scheduler import LeasedResponse, Scheduler, parse_limits
+
+
+def test_fair_queue_interleaves_users(monkeypatch):
+    monkeypatch.setattr(scheduler_module.config, "QUEUE_PER_USER", 10)
+
+    async def run():
+        scheduler = Scheduler({"ollama": 1})
+        order = []
+        first = await scheduler.acquire("ollama", "ollama/llava", "a")
+
+        async def request(user_id):
+            lease = await scheduler.acquire("ollama", "ollama/llava", user_id)
+            order.append(user_id)
+            lease.release()
+
+        tasks = [asyncio.create_task(request(user_id)) for user_id in "aaab"]
+        await asyncio.sleep(0)
+        assert scheduler.stats()["ollama"]["queued"] == 4
+        first.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == ["a", "b", "a", "a"]
+
+
+def test_full_queue_rejects_with_retry_after(monkeypatch):
+    monkeypatch.setattr(scheduler_module.config, "QUEUE_SIZE", 1)
+
+    async def run():
+        scheduler = Scheduler(parse_limits("ollama=1, bogus"))
+        await scheduler.acquire("ollama", "ollama/llava", "a")
+        waiting = asyncio.create_task(
+            scheduler.acquire("ollama", "ollama/llava", "b")
+        )
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as e:
+            await scheduler.acquire("ollama", "ollama/llava", "c")
+        waiting.cancel()
+        return e.value
+
+    error = asyncio.run(run())
+    assert error.status_code == 503
+    assert int(error.headers["Retry-After"]) >= 1
+
+
+def test_abandoned_acquire_gives_back_its_tag_and_queue_time_isnt_held():
+    async def run():
+        scheduler = Scheduler({"ollama": 1})
+        limiter = scheduler.limiters["ollama"]
+        first = await scheduler.acquire("ollama", "ollama/llava", "a")
+        waiting = asyncio.create_task(
+            scheduler.acquire("ollama", "ollama/llava", "b", cost=5)
+        )
+        await asyncio.sleep(0)
+        assert limiter.finish_tags["b"] == 5
+        waiting.cancel()
+        await asyncio.sleep(0)
+        tag = limiter.finish_tags["b"]
+
+        queued = asyncio.create_task(scheduler.acquire("ollama", "ollama/llava", "c"))
+        await asyncio.sleep(0.05)
+        granted = time.monotonic()
+        first.release()
+        lease = await queued
+        lease.release()
+        return tag, lease.started >= granted, limiter.stats()
+
+    tag, started_when_granted, stats = asyncio.run(run())
+    assert tag == 0
+    assert started_when_granted
+    assert stats["active"] == 0 and stats["queued"] == 0
+
+
+def test_leased_response_releases_when_body_is_never_read():
+    async def run():
+        scheduler = Scheduler({"ollama": 1})
+        lease = await scheduler.acquire("ollama", "ollama/llava", "a")
+        started = []
+
+        async def body():
+            started.append(True)
+            yield b"data: {}\n\n"
+
+        async def send(message):
+            raise OSError("client went away")
+
+        response = LeasedResponse([lease], body(), media_type="text/event-stream")
+        with pytest.raises(Exception):
+            scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+            await response(scope, None, send)
+        return started, lease.released, scheduler.stats()["ollama"]["active"]
+
+    assert asyncio.run(run()) == ([], True, 0)
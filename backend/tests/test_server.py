@@ -0,0 +1,37 @@
+import asyncio
+import os
+import subprocess
+import sys
+from openui import server
+
+
+def test_import_defers_heavy_dependencies():
+    # A fresh interpreter, our own test imports would pollute sys.modules
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, openui.server; "
+            "print(' '.join(m for m in ('tiktoken', 'boto3', 'weave') "
+            "if m in sys.modules))",
+        ],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "OPENAI_API_KEY": "xxx"},
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ""
+
+
+def test_prewarm_failures_dont_stop_startup(monkeypatch):
+    warmed = []
+
+    def broken():
+        raise RuntimeError("offline")
+
+    monkeypatch.setattr(server.access, "prewarm", lambda: warmed.append("database"))
+    monkeypatch.setattr(server.tokenizer, "prewarm", broken)
+    monkeypatch.setattr(server.storage, "prewarm", lambda: warmed.append("storage"))
+    monkeypatch.setattr(server, "init_weave", lambda: warmed.append("weave"))
+    asyncio.run(server.prewarm())
+    assert sorted(warmed) == ["database", "storage", "weave"]
@@ -0,0 +1,32 @@
+import datetime
+import uuid
+from openui.db.models import connect_database, Session, User
+from openui.session import DBSessionStore, SessionData
+from openui.quota import quota
+
+
+def test_session_lookup_is_cached_until_written(tmp_path, monkeypatch):
+    monkeypatch.setattr(quota, "tokens", lambda user_id: 42)
+    db = connect_database(str(tmp_path / "db.sqlite"))
+    with db.bind_ctx([Session, User]):
+        db.create_tables([Session, User])
+        monkeypatch.setattr("openui.session.ensure_migrated", lambda: None)
+        store = DBSessionStore()
+        user_id, session_id = str(uuid.uuid4()), store.generate_session_id()
+        User.create(
+            id=uuid.UUID(user_id).bytes, username="a", created_at=datetime.datetime.now()
+        )
+        store.write(session_id, user_id, SessionData(
+            username="a", token_count=0, max_tokens=None, email=None
+        ))
+
+        data = store.get(session_id)
+        assert (data.username, data.token_count) == ("a", 42)
+        User.update(username="b").execute()
+        assert store.get(session_id) is data
+
+        store.write(session_id, user_id, SessionData(
+            username="b", token_count=0, max_tokens=None, email=None
+        ))
+        assert store.get(session_id).username == "b"
+    db.close()
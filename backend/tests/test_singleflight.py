@@ -0,0 +1,171 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from openui.singleflight import SingleFlight, flight_key
+
+
+def test_followers_replay_then_follow_live():
+    async def run():
+        flights = SingleFlight()
+        release = asyncio.Event()
+        opened = []
+
+        async def source():
+            yield b"a"
+            yield b"b"
+            await release.wait()
+            yield b"c"
+
+        async def open_upstream():
+            opened.append(True)
+            return source(), 1
+
+        async def collect(flight):
+            return [chunk async for chunk in flight.subscribe()]
+
+        first, leader = flights.join("key", open_upstream)
+        await first.opened
+        leading = asyncio.create_task(collect(first))
+        await asyncio.sleep(0)
+        second, follower_leads = flights.join("key", open_upstream)
+        following = asyncio.create_task(collect(second))
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(leading, following)
+        return leader, follower_leads, second is first, opened, results, len(flights)
+
+    leader, follower_leads, shared, opened, results, remaining = asyncio.run(run())
+    assert leader and not follower_leads and shared
+    assert opened == [True]
+    assert results == [[b"a", b"b", b"c"], [b"a", b"b", b"c"]]
+    assert remaining == 0
+
+
+def test_last_subscriber_leaving_cancels_upstream():
+    async def run():
+        flights = SingleFlight()
+        closed = asyncio.Event()
+
+        async def source():
+            try:
+                yield b"a"
+                await asyncio.sleep(10)
+            finally:
+                closed.set()
+
+        async def open_upstream():
+            return source(), 1
+
+        flight, _ = flights.join("key", open_upstream)
+        await flight.opened
+        chunks = flight.subscribe()
+        assert await chunks.__anext__() == b"a"
+        await chunks.aclose()
+        await asyncio.wait_for(closed.wait(), 1)
+        return len(flights)
+
+    assert asyncio.run(run()) == 0
+
+
+def test_follower_cancelled_while_opening_doesnt_pin_upstream():
+    async def run():
+        flights = SingleFlight()
+        opening = asyncio.Event()
+        closed = asyncio.Event()
+
+        async def source():
+            try:
+                yield b"a"
+                await asyncio.sleep(10)
+            finally:
+                closed.set()
+
+        async def open_upstream():
+            await opening.wait()
+            return source(), 1
+
+        flight, _ = flights.join("key", open_upstream)
+        leading = asyncio.create_task(flight.wait_opened())
+        follower, _ = flights.join("key", open_upstream)
+        following = asyncio.create_task(follower.wait_opened())
+        await asyncio.sleep(0)
+        following.cancel()
+        await asyncio.sleep(0)
+        opening.set()
+        assert await leading == 1
+        chunks = flight.subscribe()
+        assert await chunks.__anext__() == b"a"
+        await chunks.aclose()
+        await asyncio.wait_for(closed.wait(), 1)
+        return following.cancelled(), flight.subscribers, len(flights)
+
+    assert asyncio.run(run()) == (True, 0, 0)
+
+
+def test_flight_key_covers_every_forwarded_field():
+    data = {
+        "model": "gpt-4o",
+        "messages": [{"role": "user", "content": "hi"}],
+        "temperature": 0,
+        "stream": True,
+    }
+    assert flight_key(data) == flight_key({**data, "user": "someone"})
+    for field, value in [
+        ("stream", False),
+        ("top_p", 0.5),
+        ("stop", ["</html>"]),
+        ("n", 2),
+        ("seed", 1),
+        ("response_format", {"type": "json_object"}),
+        ("tools", []),
+        ("messages", [{"role": "user", "content": "hi", "name": "x"}]),
+    ]:
+        assert flight_key(data) != flight_key({**data, field: value}), field
+
+
+def test_followers_open_again_when_the_leader_is_turned_away():
+    async def run():
+        flights = SingleFlight()
+        admitting = asyncio.Event()
+
+        async def source():
+            yield b"a"
+
+        async def rejected():
+            await admitting.wait()
+            raise HTTPException(status_code=429, detail="Too many requests")
+
+        async def admitted():
+            return source(), 2
+
+        leading = asyncio.create_task(flights.open("key", rejected, HTTPException))
+        await asyncio.sleep(0)
+        following = asyncio.create_task(flights.open("key", admitted, HTTPException))
+        await asyncio.sleep(0)
+        admitting.set()
+        with pytest.raises(HTTPException):
+            await leading
+        flight, leader, multiplier = await following
+        return leader, multiplier, [chunk async for chunk in flight.subscribe()]
+
+    assert asyncio.run(run()) == (True, 2, [b"a"])
+
+
+def test_followers_share_other_errors():
+    async def run():
+        flights = SingleFlight()
+        admitting = asyncio.Event()
+
+        async def broken():
+            await admitting.wait()
+            raise RuntimeError("upstream down")
+
+        leading = asyncio.create_task(flights.open("key", broken, HTTPException))
+        await asyncio.sleep(0)
+        following = asyncio.create_task(flights.open("key", broken, HTTPException))
+        await asyncio.sleep(0)
+        admitting.set()
+        results = await asyncio.gather(leading, following, return_exceptions=True)
+        return [str(result) for result in results]
+
+    assert asyncio.run(run()) == ["upstream down", "upstream down"]
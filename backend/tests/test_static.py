@@ -0,0 +1,50 @@
+from starlette.requests import Request
+from openui.static import AssetManifest, precompress
+
+
+def request(**headers):
+    return Request(
+        {
+            "type": "http",
+            "headers": [
+                (k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()
+            ],
+        }
+    )
+
+
+def test_manifest_serves_precompressed_assets(tmp_path):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "assets" / "index-abc123.js").write_text("console.log(1);\n" * 200)
+    (tmp_path / "index.html").write_text("<html></html>")
+    manifest = AssetManifest(tmp_path)
+    manifest.compress()
+
+    asset = manifest.get("assets/index-abc123.js")
+    plain = manifest.response(asset, request())
+    assert "Content-Encoding" not in plain.headers
+    assert "immutable" in plain.headers["Cache-Control"]
+
+    gzipped = manifest.response(asset, request(accept_encoding="gzip, br;q=0"))
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert len(gzipped.body) < len(asset.body)
+    assert gzipped.headers["ETag"] != plain.headers["ETag"]
+
+    cached = manifest.response(
+        asset, request(accept_encoding="gzip", if_none_match=gzipped.headers["ETag"])
+    )
+    assert cached.status_code == 304
+    assert manifest.get("index.html").cache_control == "no-cache"
+
+
+def test_precompressed_variants_are_loaded_not_served(tmp_path):
+    (tmp_path / "app.js").write_text("console.log(1);\n" * 200)
+    precompress(tmp_path)
+    assert (tmp_path / "app.js.gz").is_file()
+
+    manifest = AssetManifest(tmp_path)
+    asset = manifest.get("app.js")
+    assert manifest.get("app.js.gz") is None
+    assert asset.encodings["gzip"] == (tmp_path / "app.js.gz").read_bytes()
+    response = manifest.response(asset, request(accept_encoding="gzip"))
+    assert response.headers["Content-Encoding"] == "gzip"
@@ -0,0 +1,98 @@
+import io
+import pytest
+from fastapi.testclient import TestClient
+from openui import server
+from openui.util import storage
+
+
+class FakeS3:
+    """Stands in for S3 or MinIO"""
+
+    def __init__(self):
+        self.objects = {}
+        self.gets = 0
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = Body
+
+    def get_object(self, Bucket, Key):
+        self.gets += 1
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+
+SHARE = {"prompt": "a button", "name": "button", "emoji": "🔘", "html": "<b/>"}
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    cache = storage.ShareCache(tmp_path / "cache", 1024 * 1024, 1024 * 1024)
+    monkeypatch.setattr(storage, "share_cache", cache)
+    return cache
+
+
+def test_s3_share_roundtrip_passes_gzip_through(monkeypatch, cache):
+    fake = FakeS3()
+    backend = storage.S3Backend("openui", None, 4)
+    backend.client = fake
+    monkeypatch.setattr(storage, "backend", backend)
+    client = TestClient(server.app)
+    assert client.post("/v1/share/abc", json=SHARE).status_code == 201
+
+    response = client.get("/v1/share/abc", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "immutable" in response.headers["cache-control"]
+    assert response.json()["html"] == "<b/>"
+
+    response = client.get("/v1/share/abc", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.json()["name"] == "button"
+
+    etag = response.headers["etag"]
+    response = client.get(
+        "/v1/share/abc",
+        headers={"Accept-Encoding": "identity", "If-None-Match": etag},
+    )
+    assert response.status_code == 304
+    assert fake.gets == 0
+
+
+def test_filesystem_share_roundtrip(monkeypatch, cache, tmp_path):
+    monkeypatch.setattr(storage, "backend", storage.BlobStore(tmp_path / "shares"))
+    client = TestClient(server.app)
+    assert client.get("/v1/share/missing").status_code == 404
+    assert client.post("/v1/share/abc", json=SHARE).status_code == 201
+    cache.memory.clear()
+
+    response = client.get("/v1/share/abc", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json() == SHARE
+    assert len(list((tmp_path / "shares" / "blobs").glob("*/*/*.gz"))) == 1
+
+
+def test_share_cache_reads_through_disk(tmp_path):
+    body = storage.compress('{"html": "<b/>"}')
+    storage.ShareCache(tmp_path, 1024, 1024).put("abc.json", body)
+    # A fresh process only has the disk tier
+    sha, cached = storage.ShareCache(tmp_path, 1024, 1024).get("abc.json")
+    assert cached == body and sha == storage.digest(body)
+
+
+def test_s3_client_is_created_once_across_threads(monkeypatch):
+    import time
+    import boto3
+    from concurrent.futures import ThreadPoolExecutor
+
+    created = []
+
+    def client(*args, **kwargs):
+        created.append(args)
+        # Wide enough a window for every thread to race in
+        time.sleep(0.05)
+        return object()
+
+    monkeypatch.setattr(boto3, "client", client)
+    backend = storage.S3Backend("bucket", None, 8)
+    with ThreadPoolExecutor(8) as pool:
+        clients = list(pool.map(lambda _: backend.s3(), range(8)))
+    assert len(created) == 1
+    assert all(c is clients[0] for c in clients)
@@ -0,0 +1,102 @@
+import asyncio
+import base64
+import hashlib
+import os
+import subprocess
+import sys
+import pytest
+import tiktoken
+import tiktoken.load
+import tiktoken.registry
+from openui import tokenizer
+
+BPE = b"".join(base64.b64encode(bytes([i])) + f" {i}\n".encode() for i in range(256))
+
+
+def byte_encoding(name):
+    return tiktoken.Encoding(
+        name=name,
+        pat_str=r"\S+|\s+",
+        mergeable_ranks={bytes([i]): i for i in range(256)},
+        special_tokens={},
+    )
+
+
+def test_counts_are_memoized_per_message(monkeypatch):
+    monkeypatch.setitem(tokenizer.encodings, "o200k_base", byte_encoding("o200k_base"))
+    tokenizer.message_counts.clear()
+    messages = [
+        {"role": "system", "content": "abc"},
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": "de"},
+                {"type": "image_url", "image_url": {"url": "data:,"}},
+            ],
+        },
+    ]
+    assert tokenizer.count_tokens(messages, "gpt-4o") == 5
+    assert len(tokenizer.message_counts) == 2
+    messages.append({"role": "assistant", "content": "fghi"})
+    assert asyncio.run(tokenizer.acount_tokens(messages, "gpt-4o-mini")) == 9
+    assert len(tokenizer.message_counts) == 3
+
+
+def test_encoding_families():
+    assert tokenizer.encoding_name("gpt-4o-mini") == "o200k_base"
+    assert tokenizer.encoding_name("litellm/gpt-4o") == "o200k_base"
+    assert tokenizer.encoding_name("gpt-4-turbo") == "cl100k_base"
+    assert tokenizer.encoding_name("ollama/llama3") == "cl100k_base"
+    assert tokenizer.encoding_name(None) == "cl100k_base"
+
+
+@pytest.mark.parametrize("user_dir", [None, "/srv/tiktoken"])
+def test_cache_dir_defaults_under_home(tmp_path, user_dir):
+    env = {**os.environ, "HOME": str(tmp_path), "OPENAI_API_KEY": "xxx"}
+    env.pop("TIKTOKEN_CACHE_DIR", None)
+    if user_dir:
+        env["TIKTOKEN_CACHE_DIR"] = user_dir
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import os, openui.config; print(os.environ['TIKTOKEN_CACHE_DIR'])",
+        ],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    assert result.returncode == 0, result.stderr
+    expected = user_dir or str(tmp_path / ".openui" / "tiktoken")
+    assert result.stdout.strip() == expected
+
+
+def test_prewarm_downloads_encodings_into_the_cache_dir(tmp_path, monkeypatch):
+    downloads = []
+
+    def read_file(url):
+        downloads.append(url)
+        return BPE
+
+    def offline(url):
+        raise ConnectionError(url)
+
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(tiktoken.load, "read_file", read_file)
+    monkeypatch.setattr(tiktoken.load, "check_hash", lambda data, expected: True)
+    monkeypatch.setattr(tiktoken.registry, "ENCODINGS", {})
+    monkeypatch.setattr(tokenizer, "encodings", {})
+    tokenizer.prewarm()
+    assert sorted(tokenizer.encodings) == sorted(tokenizer.ENCODINGS)
+    assert [url.rsplit("/", 1)[-1] for url in downloads] == [
+        f"{name}.tiktoken" for name in tokenizer.ENCODINGS
+    ]
+    cached = {hashlib.sha1(url.encode()).hexdigest() for url in downloads}
+    assert {path.name for path in tmp_path.iterdir()} == cached
+
+    # Later processes load from the cache without a network
+    monkeypatch.setattr(tiktoken.load, "read_file", offline)
+    monkeypatch.setattr(tiktoken.registry, "ENCODINGS", {})
+    monkeypatch.setattr(tokenizer, "encodings", {})
+    tokenizer.prewarm()
+    assert sorted(tokenizer.encodings) == sorted(tokenizer.ENCODINGS)
@@ -0,0 +1,101 @@
+import asyncio
+import datetime
+import uuid
+import pytest
+from openui import usage
+from openui.db import access
+from openui.db.models import connect_database, Usage, User
+from openui.usage import UsageAggregator
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    db = connect_database(str(tmp_path / "db.sqlite"))
+    monkeypatch.setattr(access, "database", db)
+    monkeypatch.setattr(usage, "database", db)
+    with db.bind_ctx([User, Usage]):
+        db.create_tables([User, Usage])
+        yield db
+    db.close()
+
+
+def make_user() -> str:
+    user_id = uuid.uuid4()
+    User.create(
+        id=user_id.bytes, username=str(user_id), created_at=datetime.datetime.now()
+    )
+    return str(user_id)
+
+
+def totals() -> dict[str, tuple[int, int]]:
+    return {
+        str(row.user_id): (row.input_tokens, row.output_tokens)
+        for row in Usage.select()
+    }
+
+
+def test_records_merge_into_one_row_per_user_and_day(db):
+    aggregator = UsageAggregator(interval=60, size=100)
+    alice, bob = make_user(), make_user()
+    aggregator.record(alice, 10, 1)
+    aggregator.record(alice, 20, 2)
+    aggregator.record(bob, 5, 5)
+    assert len(aggregator.pending) == 2
+    assert aggregator.pending_tokens(alice) == 33
+    assert aggregator.flush() == 2
+    assert totals() == {alice: (30, 3), bob: (5, 5)}
+    assert aggregator.pending == {}
+
+
+def test_flush_adds_to_existing_rows(db):
+    aggregator = UsageAggregator(interval=60, size=100)
+    alice = make_user()
+    Usage.update_tokens(alice, 100, 10)
+    aggregator.record(alice, 1, 2)
+    aggregator.flush()
+    aggregator.record(alice, 3, 4)
+    aggregator.flush()
+    assert totals() == {alice: (104, 16)}
+
+
+def test_flushes_once_enough_rows_are_pending(db):
+    aggregator = UsageAggregator(interval=60, size=2)
+    alice, bob = make_user(), make_user()
+
+    async def run():
+        aggregator.record(alice, 1, 1)
+        aggregator.record(alice, 1, 1)
+        flushing = aggregator.flushing
+        aggregator.record(bob, 1, 1)
+        await aggregator.flushing
+        return flushing
+
+    assert asyncio.run(run()) is None
+    assert totals() == {alice: (2, 2), bob: (1, 1)}
+
+
+def test_failed_flush_keeps_pending_usage(db):
+    aggregator = UsageAggregator(interval=60, size=100)
+    alice = make_user()
+    aggregator.record(alice, 10, 1)
+    db.execute_sql("DROP TABLE usage")
+    assert aggregator.flush() == 0
+    aggregator.record(alice, 5, 5)
+    assert aggregator.pending_tokens(alice) == 21
+    db.create_tables([Usage])
+    assert aggregator.flush() == 1
+    assert totals() == {alice: (15, 6)}
+
+
+def test_stop_drains_pending_usage(db):
+    aggregator = UsageAggregator(interval=60, size=100)
+    alice = make_user()
+
+    async def run():
+        aggregator.start()
+        aggregator.record(alice, 7, 3)
+        await aggregator.stop()
+        return aggregator.task
+
+    assert asyncio.run(run()) is None
+    assert totals() == {alice: (7, 3)}
@@ -0,0 +1,76 @@
+import pytest
+from uvicorn import Config
+from openui import server
+from openui.__main__ import arg_value
+
+
+class FakeProcess:
+    def __init__(self):
+        self.alive = False
+        self.pid = 1
+        self.exitcode = 1
+
+    def start(self):
+        self.alive = True
+
+    def is_alive(self):
+        return self.alive
+
+
+def make_supervisor(monkeypatch, workers: int = 2) -> server.Supervisor:
+    spawned = []
+
+    def get_subprocess(config, target, sockets):
+        spawned.append(FakeProcess())
+        return spawned[-1]
+
+    monkeypatch.setattr(server, "get_subprocess", get_subprocess)
+    supervisor = server.Supervisor(
+        Config("openui.server:app", workers=workers), target=None, sockets=[]
+    )
+    supervisor.processes = [FakeProcess() for _ in range(workers)]
+    for process in supervisor.processes:
+        process.start()
+    supervisor.started = [0] * workers
+    supervisor.failures = [0] * workers
+    supervisor.restarts = {}
+    return supervisor
+
+
+def test_crashed_worker_is_replaced_right_away(monkeypatch):
+    supervisor = make_supervisor(monkeypatch)
+    supervisor.processes[0].alive = False
+    assert supervisor.check(60)
+    assert supervisor.check(60)
+    assert supervisor.processes[0].is_alive() and supervisor.started[0] == 60
+    assert supervisor.failures == [0, 0]
+
+
+def test_worker_failing_to_boot_backs_off_then_gives_up(monkeypatch):
+    supervisor = make_supervisor(monkeypatch, workers=1)
+    now = 0.0
+    delays = []
+    for _ in range(supervisor.MAX_BOOT_FAILURES - 1):
+        supervisor.processes[0].alive = False
+        assert supervisor.check(now)
+        delays.append(supervisor.restarts[0] - now)
+        now = supervisor.restarts[0]
+        assert supervisor.check(now)
+        assert supervisor.processes[0].is_alive()
+    supervisor.processes[0].alive = False
+    assert not supervisor.check(now)
+    assert delays == [1, 2, 4, 8]
+
+
+@pytest.mark.parametrize(
+    "argv, expected",
+    [
+        (["openui"], "1"),
+        (["openui", "--workers", "4"], "4"),
+        (["openui", "--workers=3", "--dev"], "3"),
+        (["openui", "--workers"], "1"),
+    ],
+)
+def test_workers_argument(monkeypatch, argv, expected):
+    monkeypatch.setattr("sys.argv", argv)
+    assert arg_value("--workers", "1") == expected